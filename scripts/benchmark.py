@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+
+# Benchmarks exportcsv.py against synthetic experiments. The real CSV files can't be committed, so
+# this generates runs with the same shape and naming as Main.in's, so that the performance of an
+# export can be measured the same way on any machine.
+#
+# Requires a Unix-like OS for measuring peak memory usage.
+# pip install -r requirements.txt
+
+import argparse
+import json
+import os
+import py_compile
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from colorama import Fore, Style, init as colorama_init
+import numpy as np
+
+import exportlib
+
+# The path of the export script to benchmark.
+EXPORTCSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exportcsv.py")
+# The path of the sweep script, whose output is checked to export.
+SWEEP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sweep.py")
+# The default path to save baselines to, and compare against.
+DEFAULT_BASELINES_PATH = "benchmark_baselines.json"
+# The fraction of the rows of a run which fall before the pulse, and after it. The rest are in the
+# pulse window, where Main.in uses a much smaller timestep.
+PEDESTAL_ROW_FRACTION = 0.1
+# The rise time of a synthetic pulse.
+RISE_TIME = 5e-9
+# The current which flows through a device before the pulse, per volt.
+DARK_CURRENT_PER_VOLT = 1e-10
+# The peak current of a synthetic pulse, per volt, per unit of electron-hole pair density.
+PEAK_CURRENT_PER_VOLT_DENSITY = 1e-3
+# The standard deviation of the noise added to the current, relative to the current.
+CURRENT_NOISE = 1e-3
+# The smallest change in a measurement, in seconds or megabytes, that can count as a regression.
+# Phases that take next to no time can otherwise swing by hundreds of percent from noise.
+NOISE_FLOOR = 0.05
+# The default number of seconds that exportcsv.py may take to start up, on top of the interpreter,
+# for commands that only deal with metadata.
+DEFAULT_STARTUP_BUDGET = 0.075
+# The name of the file to have exports write their metrics to.
+METRICS_FILENAME = "benchmark_metrics.json"
+
+
+def synthesize_waveform(rng, voltage, lifetime, density, rows):
+  """Synthesizes the transient time and substrate current of a run, shaped like the transient
+  simulated by Main.in: a flat pedestal with large timesteps, a pulse that rises quickly and decays
+  with the carrier lifetime in a window with small timesteps, and then the rest of the pedestal.
+  """
+  num_pedestal_rows = max(int(rows * PEDESTAL_ROW_FRACTION), 2)
+  num_pulse_rows = max(rows - 2 * num_pedestal_rows, 2)
+  time = np.concatenate((
+      np.linspace(0, exportlib.TIME_EVENT_START, num_pedestal_rows, endpoint=False),
+      np.linspace(exportlib.TIME_EVENT_START, exportlib.TIME_PULSE_END, num_pulse_rows,
+                  endpoint=False),
+      np.linspace(exportlib.TIME_PULSE_END, 2 * exportlib.TIME_PULSE_END, num_pedestal_rows)))
+  since_event = np.clip(time - exportlib.TIME_EVENT_START, 0, None)
+  pulse = (1 - np.exp(-since_event / RISE_TIME)) * np.exp(-since_event / lifetime)
+  current = voltage * (DARK_CURRENT_PER_VOLT + PEAK_CURRENT_PER_VOLT_DENSITY * density * pulse)
+  current *= 1 + CURRENT_NOISE * rng.standard_normal(time.size)
+  return time, current
+
+
+def write_run(path, time, current, log=False):
+  """Writes a run, either as a CSV file exported from Tonyplot, or as an Atlas time log, with a
+  header declaring every quantity. The quantities other than the transient time and substrate
+  current are zeroed out.
+  """
+  num_cols = max(exportlib.CSV_TIME_COL, exportlib.CSV_CURRENT_COL) + 1
+  data = np.zeros((time.size, num_cols))
+  data[:, exportlib.CSV_TIME_COL] = time
+  data[:, exportlib.CSV_CURRENT_COL] = current
+  header = ["Quantity {}".format(col) for col in range(num_cols)]
+  header[exportlib.CSV_TIME_COL], header[exportlib.CSV_CURRENT_COL] = exportlib.LOG_HEADER
+  if log:
+    np.savetxt(path, data, fmt="%.6e", comments="", header="\n".join(
+        ["Title Atlas log"] + ["{} {}".format(exportlib.LOG_QUANTITY_KEYWORD, quantity)
+                               for quantity in header]))
+  else:
+    np.savetxt(path, data, fmt="%.6e", delimiter=",", header=",".join(header), comments="")
+
+
+def generate_experiment(out_dir, devices, voltages, lifetimes, densities, rows, seed=0, log=False):
+  """Generates a synthetic experiment with a run for every combination of the given devices,
+  voltages, lifetimes, and densities. These are given as strings, and put into the file names
+  verbatim, like Main.in does. Returns the paths of the files written.
+  """
+  os.makedirs(out_dir, exist_ok=True)
+  rng = np.random.default_rng(seed)
+  suffix = exportlib.LOG_FILENAME_SUFFIX if log else ".csv"
+  paths = []
+  for device in devices:
+    for voltage in voltages:
+      for lifetime in lifetimes:
+        for density in densities:
+          path = os.path.join(out_dir, "{}_{}{}_{}{}_{}{}{}".format(
+              device, exportlib.VOLTAGE_FILENAME_STR, voltage, exportlib.LIFETIME_FILENAME_STR,
+              lifetime, exportlib.DENSITY_FILENAME_STR, density, suffix))
+          time, current = synthesize_waveform(
+              rng, float(voltage), float(lifetime), float(density), rows)
+          write_run(path, time, current, log)
+          paths.append(path)
+  return paths
+
+
+def time_export(exp_dir, work_dir, export_args):
+  """Runs exportcsv.py on an experiment, in a separate process, and reads the wall time of each of
+  its phases back from its metrics. Whatever time isn't in a phase is the startup of the
+  interpreter, and the imports. Returns the duration of each phase in seconds, and the total.
+  """
+  metrics_path = os.path.join(work_dir, METRICS_FILENAME)
+  start = time.perf_counter()
+  subprocess.run([sys.executable, EXPORTCSV_PATH, "export", exp_dir, "--metrics-json",
+                  metrics_path] + export_args, cwd=work_dir, stdout=subprocess.DEVNULL, check=True)
+  total = time.perf_counter() - start
+  with open(metrics_path, encoding="utf-8") as f:
+    phases = json.load(f)["phases"]
+  timings = {"startup": total - sum(phase["wall_time"] for phase in phases)}
+  for phase in phases:
+    timings[phase["name"]] = phase["wall_time"]
+  timings["total"] = total
+  return timings
+
+
+def time_parsing(paths, method="rectangle"):
+  """Times reading and integrating every file of an experiment in this process, without the cache.
+  This is the part of the export that scales with the number of rows, but it is interleaved with
+  writing the sheets, so it can't be timed from the phases. Returns the time in seconds, and the
+  number of rows read.
+  """
+  num_rows = 0
+  start = time.perf_counter()
+  for path in paths:
+    run = exportlib.reduce_waveform(path, method)
+    if run:
+      num_rows += run["time"].size
+  return time.perf_counter() - start, num_rows
+
+
+def time_command(argv, repeat):
+  """Runs a Python command several times, and returns the median of its wall time, in seconds.
+  """
+  times = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + argv, stdout=subprocess.DEVNULL, check=True)
+    times.append(time.perf_counter() - start)
+  return float(np.median(times))
+
+
+def generate(args):
+  print(Fore.GREEN + "Generating experiment...")
+  paths = generate_experiment(args.out, args.devices, args.voltages, args.lifetimes,
+                              args.densities, args.rows, args.seed, args.logs)
+  print(Fore.WHITE + "Wrote {} files to \"{}\".".format(len(paths), args.out))
+  print(Fore.GREEN + "Success.")
+  os.sys.exit(0)
+
+
+def run(args):
+  # Everything after "--" is passed to the export.
+  export_args = [a for a in args.export_args if a != "--"]
+  case = args.name or " ".join(
+      ["{}x{}x{}x{}x{}".format(len(args.devices), len(args.voltages), len(args.lifetimes),
+                               len(args.densities), args.rows)] + export_args +
+      (["(cached)"] if args.keep_cache else []))
+
+  with tempfile.TemporaryDirectory() as work_dir:
+    print(Fore.GREEN + "Generating experiment...")
+    exp_dir = os.path.join(work_dir, "benchmark")
+    paths = generate_experiment(exp_dir, args.devices, args.voltages, args.lifetimes,
+                                args.densities, args.rows, args.seed, args.logs)
+    num_bytes = sum(os.path.getsize(p) for p in paths)
+    print(Fore.WHITE + "Wrote {} files, totaling {:.1f} MB.".format(len(paths), num_bytes / 1e6))
+    print(Fore.GREEN + "Success.")
+
+    print(Fore.GREEN + "Timing parsing...")
+    parse_times = []
+    for _ in range(args.repeat):
+      parse_time, num_rows = time_parsing(paths)
+      parse_times.append(parse_time)
+    print(Fore.GREEN + "Success.")
+
+    print(Fore.GREEN + "Timing exports...")
+    export_timings = []
+    for repeat_n in range(args.repeat):
+      # Keep the exports from reading each other's workbooks and caches, so that every one of them
+      # parses the files, unless the cache is meant to be measured.
+      for leftover in (exportlib.WORKBOOK_PATH, exportlib.MANIFEST_PATH):
+        if os.path.exists(os.path.join(work_dir, leftover)):
+          os.remove(os.path.join(work_dir, leftover))
+      if not args.keep_cache:
+        shutil.rmtree(os.path.join(exp_dir, exportlib.CACHE_DIR_NAME), ignore_errors=True)
+      export_timings.append(time_export(exp_dir, work_dir, export_args))
+      print(Fore.WHITE + "- Run {}: {:.2f} s".format(repeat_n + 1, export_timings[-1]["total"]))
+    print(Fore.GREEN + "Success.")
+
+  # Take the median of each measurement, which is less sensitive to a noisy neighbor than the mean.
+  results = {"parsing": float(np.median(parse_times))}
+  for phase in export_timings[0]:
+    results[phase] = float(np.median([t.get(phase, 0) for t in export_timings]))
+  # On Linux, this is in kilobytes, and it's the peak of the largest process that was waited for.
+  results["peak rss (MB)"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+  print(Fore.CYAN + "Results for \"{}\":".format(case))
+  print(Fore.WHITE + "- {} rows, at {:.0f} rows/s parsed.".format(
+      num_rows, num_rows / results["parsing"]))
+  for metric, value in results.items():
+    print(Fore.WHITE + "- {}: ".format(metric) + Style.BRIGHT + "{:.3f}".format(value))
+
+  baselines = {}
+  if os.path.exists(args.baselines):
+    with open(args.baselines, encoding="utf-8") as f:
+      baselines = json.load(f)
+
+  status = 0
+  if args.compare:
+    baseline = baselines.get(case)
+    if not baseline:
+      print(Fore.YELLOW + "No baseline saved for \"{}\" in \"{}\".".format(case, args.baselines))
+    else:
+      print(Fore.CYAN + "Compared to baseline:")
+      # Every metric is a time or a size, so lower is always better.
+      for metric, value in results.items():
+        if metric not in baseline:
+          continue
+        change = value / baseline[metric] - 1 if baseline[metric] else 0
+        if abs(value - baseline[metric]) < NOISE_FLOOR:
+          color = Fore.WHITE
+        elif change > args.tolerance:
+          color, status = Fore.RED, 1
+        elif change < -args.tolerance:
+          color = Fore.GREEN
+        else:
+          color = Fore.WHITE
+        print(color + "- {}: {:.3f} -> {:.3f} ({:+.0%})".format(
+            metric, baseline[metric], value, change))
+      if status:
+        print(Fore.RED + "Regressed by more than {:.0%}.".format(args.tolerance))
+
+  if args.save:
+    baselines[case] = results
+    with open(args.baselines, "w", encoding="utf-8") as f:
+      json.dump(baselines, f, indent=2)
+    print(Fore.WHITE + "Saved baseline for \"{}\" to \"{}\".".format(case, args.baselines))
+
+  if not status:
+    print(Fore.GREEN + "Success.")
+  os.sys.exit(status)
+
+
+def startup(args):
+  with tempfile.TemporaryDirectory() as data_dir:
+    generate_experiment(os.path.join(data_dir, "benchmark"), ["PC"], ["10"], ["1e-7"], ["1e-4"],
+                        10)
+    # Cache the bytecode of exportlib.py, like its first import normally would, in case writing
+    # bytecode is turned off. Otherwise, compiling it would be timed on every run.
+    py_compile.compile(exportlib.__file__, doraise=True)
+    print(Fore.GREEN + "Timing startup...")
+    interpreter_time = time_command(["-c", "pass"], args.repeat)
+    print(Fore.WHITE + "- Interpreter: {:.0f} ms".format(interpreter_time * 1e3))
+    status = 0
+    for name, argv in (("-h", [EXPORTCSV_PATH, "-h"]),
+                       ("ls", [EXPORTCSV_PATH, "ls", data_dir])):
+      startup_time = time_command(argv, args.repeat) - interpreter_time
+      color = Fore.WHITE
+      if startup_time > args.budget:
+        color, status = Fore.RED, 1
+      print(color + "- {}: +{:.0f} ms".format(name, startup_time * 1e3))
+  if status:
+    print(Fore.RED + "Startup took more than {:.0f} ms.".format(args.budget * 1e3))
+  else:
+    print(Fore.GREEN + "Success.")
+  os.sys.exit(status)
+
+
+def sweep(args):
+  with tempfile.TemporaryDirectory() as work_dir:
+    # Run the default grid of sweep.py, since that's what is run in practice, with the stub
+    # simulator writing its time logs.
+    exp_dir = os.path.join(work_dir, "sweep")
+    print(Fore.GREEN + "Running sweep...")
+    if subprocess.run([sys.executable, SWEEP_PATH, "run", exp_dir, "--stub", "-j", str(args.jobs)],
+                      stdout=subprocess.DEVNULL).returncode:
+      print(Fore.RED + "Sweep failed.")
+      os.sys.exit(1)
+    log_paths = sorted(os.path.join(exp_dir, name) for name in os.listdir(exp_dir)
+                       if name.endswith(exportlib.LOG_FILENAME_SUFFIX))
+    print(Fore.WHITE + "Wrote {} time logs.".format(len(log_paths)))
+    print(Fore.GREEN + "Success.")
+
+    print(Fore.GREEN + "Exporting sweep...")
+    if subprocess.run([sys.executable, EXPORTCSV_PATH, "export", exp_dir, "--no-store"],
+                      cwd=work_dir, stdout=subprocess.DEVNULL).returncode:
+      print(Fore.RED + "Export failed.")
+      os.sys.exit(1)
+    # Every time log should have a run sheet of its own.
+    manifest = exportlib.load_manifest(os.path.join(work_dir, exportlib.MANIFEST_PATH))
+    exported_paths = {run["path"] for run in manifest["runs"].values()}
+    missing_paths = [path for path in log_paths if os.path.abspath(path) not in exported_paths]
+  if missing_paths:
+    print(Fore.RED + "{} of {} time logs weren't exported:".format(
+        len(missing_paths), len(log_paths)))
+    for path in missing_paths:
+      print(Fore.WHITE + "- " + os.path.basename(path))
+    os.sys.exit(1)
+  print(Fore.WHITE + "Exported {} runs.".format(len(exported_paths)))
+  print(Fore.GREEN + "Success.")
+  os.sys.exit(0)
+
+
+def add_experiment_arguments(parser):
+  """Adds the arguments describing a synthetic experiment to a subcommand's parser.
+  """
+  parser.add_argument(
+      "--devices", help="Devices to generate runs for.", nargs="+", default=["PC", "Diode"])
+  parser.add_argument(
+      "--voltages", help="Voltages to generate runs for.", nargs="+", default=["10", "100"])
+  parser.add_argument(
+      "--lifetimes", help="Lifetimes to generate runs for.", nargs="+",
+      default=["1e-7", "1e-6", "1e-5"])
+  parser.add_argument(
+      "--densities", help="Electron-hole pair densities to generate runs for.", nargs="+",
+      default=["1e-5", "1e-4", "1e-3"])
+  parser.add_argument(
+      "--rows", help="Number of rows to generate for each run.", type=int, default=1000)
+  parser.add_argument(
+      "--seed", help="Seed for the noise added to the current.", type=int, default=0)
+  parser.add_argument(
+      "--logs", help="Generate Atlas time logs, rather than CSV files.", action="store_true")
+
+
+def main():
+  """Entrypoint for subcommands.
+  """
+
+  colorama_init(autoreset=True)
+
+  parser = argparse.ArgumentParser()
+  subparsers = parser.add_subparsers()
+
+  subparser_generate = subparsers.add_parser(
+      "generate", help="Generates a synthetic experiment.")
+  subparser_generate.add_argument(
+      "out", help="Directory to write the experiment to.", type=str)
+  add_experiment_arguments(subparser_generate)
+  subparser_generate.set_defaults(func=generate)
+
+  subparser_run = subparsers.add_parser(
+      "run", help="Benchmarks exporting a synthetic experiment. Arguments after \"--\" are passed \
+to the export.")
+  add_experiment_arguments(subparser_run)
+  subparser_run.add_argument(
+      "-n",
+      "--repeat",
+      help="Number of times to run the benchmark. The median of each measurement is reported.",
+      type=int,
+      default=3)
+  subparser_run.add_argument(
+      "--keep-cache",
+      help="Keep the cache of parsed files between runs, so that every export after the first \
+reads from it, rather than parsing the files.",
+      action="store_true")
+  subparser_run.add_argument(
+      "--name",
+      help="Name to save and compare the results under. Defaults to a description of the \
+experiment and export arguments.",
+      type=str)
+  subparser_run.add_argument(
+      "--baselines",
+      help="File to save baselines to, and compare against.",
+      type=str,
+      default=DEFAULT_BASELINES_PATH)
+  subparser_run.add_argument(
+      "--save", help="Save the results as the baseline.", action="store_true")
+  subparser_run.add_argument(
+      "--compare",
+      help="Compare the results against the baseline, exiting with an error if they regressed.",
+      action="store_true")
+  subparser_run.add_argument(
+      "--tolerance",
+      help="Fraction by which a measurement may be worse than its baseline before it is counted \
+as a regression.",
+      type=float,
+      default=0.2)
+  subparser_run.add_argument(
+      "export_args", help=argparse.SUPPRESS, nargs=argparse.REMAINDER)
+  subparser_run.set_defaults(func=run)
+
+  subparser_startup = subparsers.add_parser(
+      "startup", help="Checks that the commands of exportcsv.py that only deal with metadata start \
+up within a budget.")
+  subparser_startup.add_argument(
+      "-n",
+      "--repeat",
+      help="Number of times to run each command. The median time is reported.",
+      type=int,
+      default=10)
+  subparser_startup.add_argument(
+      "--budget",
+      help="Number of seconds that each command may take, on top of starting the interpreter.",
+      type=float,
+      default=DEFAULT_STARTUP_BUDGET)
+  subparser_startup.set_defaults(func=startup)
+
+  subparser_sweep = subparsers.add_parser(
+      "sweep", help="Checks that a sweep run by sweep.py, with its stub simulator, can be exported \
+by exportcsv.py, end to end.")
+  subparser_sweep.add_argument(
+      "-j",
+      "--jobs",
+      help="Number of simulations to run at once.",
+      type=int,
+      default=os.cpu_count())
+  subparser_sweep.set_defaults(func=sweep)
+
+  args = parser.parse_args()
+  args.func(args)
+
+
+if __name__ == "__main__":
+  main()
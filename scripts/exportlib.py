@@ -0,0 +1,3008 @@
+# The implementation of exportcsv.py. It's a module of its own, rather than being part of the
+# script, so that it's compiled once, and then loaded from its cached bytecode, rather than being
+# compiled from scratch every time the script is run. It can also be imported by other scripts.
+#
+# Requires Python >= 3.8 for assignment within condition: https://www.python.org/dev/peps/pep-0572/.
+# Also requires Python >= 3.6 for preserving order of inseration for dictionaries.
+# Also requires Python >= 3.5 for recursive support in glob.
+# pip install -r requirements.txt
+
+# Compatibility:
+# - Microsoft Excel works mostly well. The graphs with blank cells in them do not work by default.
+# In desktop Excel, this can be fixed by changing how hidden and empty cells are displayed in the
+# data sources. In online Excel, I don't know of any way of fixing this.
+# - Google Sheets has issues with decimal places. The default level of precision does not display
+# the numbers properly in the tables, although graphs seem to work fine. Sheets has the best default
+# behavior with the blank cells, opting to draw them as points (and this can be further improved
+# by manually setting it to plot null values.
+# - LibreOffice Calc pretty much works in the same way as Excel, except I don't know of any way to
+# fix how it treats the blank cells.
+
+import argparse
+import collections
+import csv
+import datetime
+import functools
+from glob import glob
+import importlib.util
+import itertools
+import json
+import mmap
+import os
+import re
+import sys
+import select
+import struct
+from time import perf_counter, process_time, sleep
+
+from colorama import Fore, Style, init as colorama_init
+
+# The resource module is only available on Unix-like OSes, so peak memory usage is only reported on
+# them.
+try:
+  import resource
+except ImportError:
+  resource = None
+
+
+def lazy_import(name):
+  """Imports a module lazily, so that it's only actually loaded once one of its attributes is
+  used. NumPy and openpyxl take hundreds of milliseconds to import, which subcommands like ls, and
+  -h, have no use for, and even some of the standard library takes a noticeable amount of time.
+  See: https://docs.python.org/3/library/importlib.html#implementing-lazy-imports.
+  """
+  if name in sys.modules:
+    return sys.modules[name]
+  spec = importlib.util.find_spec(name)
+  if spec is None:
+    raise ModuleNotFoundError("No module named '{}'".format(name), name=name)
+  loader = importlib.util.LazyLoader(spec.loader)
+  spec.loader = loader
+  module = importlib.util.module_from_spec(spec)
+  sys.modules[name] = module
+  loader.exec_module(module)
+  return module
+
+
+# Only export needs these.
+concurrent_futures = lazy_import("concurrent.futures")
+ctypes = lazy_import("ctypes")
+cProfile = lazy_import("cProfile")
+ElementTree = lazy_import("xml.etree.ElementTree")
+hashlib = lazy_import("hashlib")
+np = lazy_import("numpy")
+openpyxl = lazy_import("openpyxl")
+pstats = lazy_import("pstats")
+sqlite3 = lazy_import("sqlite3")
+zipfile = lazy_import("zipfile")
+
+# The default data directory to look for experiments in.
+DEFAULT_DATA_DIR = "../data"
+# The substring of the filename to use for the voltage.
+VOLTAGE_FILENAME_STR = "voltage"
+# The substring of the filename to use for the lifetime.
+LIFETIME_FILENAME_STR = "lifetime"
+# The substring of the filename to use for the density.
+DENSITY_FILENAME_STR = "ehpdensity"
+# The number of rows for a table in the all integrals sheet which are not used for data. This is
+# used to offset the relative pool row numbers.
+NUM_NON_DATA_ROWS = 2
+# The number of columns for a table in the all integrals sheet which are not used for data. This is
+# used to offset the relative pool row numbers.
+NUM_NON_DATA_COLUMNS = 2
+# Number of blank rows/columns to insert between tables and charts.
+NUM_PADDING_CELLS = 1
+# The column of the all integrals sheet which is used for voltage.
+ALLINT_VOLTAGE_COL = 1
+# The column of the all integrals sheet which is used for lifetimes.
+ALLINT_LIFETIME_COL = 2
+# The column of the diode integrals sheet which is used for densities.
+DIODE_DENSITY_COL = 1
+# The pattern of a number in a file name, as printed by Atlas, e.g. "10", "0.0001", or "1e-07".
+FILENAME_NUMBER_PATTERN = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+# Matches a field of a file name named by Main.in, naming the group after the parameter it gives.
+# Each field must be at the start of the name, or follow an underscore, and must be followed by an
+# underscore, or by the extension.
+RUN_FILENAME_FIELD_RE = re.compile(r"""
+    (?:^|_)
+    (?:
+      (?P<device>PC|Diode)
+      |(?P<length>{number})um
+      |(?P<dopant_type>Psub|Nsub)
+      |{voltage}(?P<{voltage}>{number})
+      |{lifetime}(?P<{lifetime}>{number})
+      |{density}(?P<{density}>{number})
+      |(?P<dopant_concentration>{number})
+    )
+    (?=_|\.|$)""".format(number=FILENAME_NUMBER_PATTERN, voltage=VOLTAGE_FILENAME_STR,
+                         lifetime=LIFETIME_FILENAME_STR, density=DENSITY_FILENAME_STR),
+    re.VERBOSE)
+# The length of the silicon substrate, in microns, when Main.in leaves it out of the file name.
+DEFAULT_SI_LENGTH = 100
+# The type of the bulk dopant, when Main.in leaves it out of the file name.
+DEFAULT_DOPANT_TYPE = "Nsub"
+# The concentration of the bulk dopant of each device, when Main.in leaves it out of the file name.
+DEFAULT_DOPANT_CONCENTRATIONS = {"PC": 1e15, "Diode": 1e12}
+# The voltage applied to the device, in V, when Main.in leaves it out of the file name.
+DEFAULT_VOLTAGE = 10
+# The lifetime of electrons and holes, in s, when Main.in leaves it out of the file name.
+DEFAULT_LIFETIME = 1e-7
+# The density of electron-hole pairs, in pC/μm, when Main.in leaves it out of the file name. Note
+# that this isn't the density that Main.in sets by default.
+DEFAULT_DENSITY = 1e-5
+# The time at which the single-event upset starts in Main.in, in s. Everything before this is the
+# pedestal.
+TIME_EVENT_START = 1e-6
+# The width of the window that Main.in simulates the pulse in, with small timesteps, in s. This is
+# only where Main.in starts, since it's meant to be fit to the size of the pulse, so the checks can
+# be given another width.
+PULSE_WIDTH = 1000e-9
+# The time at which the pulse window ends in Main.in, in s. The simulation runs for twice this long.
+TIME_PULSE_END = TIME_EVENT_START + PULSE_WIDTH
+# The fewest points that a run should have in the pulse window. Main.in caps the timestep in the
+# window at a fiftieth of its width, so that there are about this many.
+MIN_PULSE_POINTS = 50
+# The metrics of each pulse, in the order of the columns of the pulse metrics sheet, along with
+# their headers.
+PULSE_METRICS = (
+    ("baseline", "Baseline (A)"),
+    ("peak", "Peak Current (A)"),
+    ("peak_time", "Peak Time (s)"),
+    ("rise_time", "Rise Time (s)"),
+    ("fall_time", "Fall Time (s)"),
+    ("fwhm", "FWHM (s)"),
+    ("charge", "Collected Charge (C)"),
+)
+# The lifetime that the diode integrals sheet analyzes the Diode at.
+DIODE_LIFETIME = 1e-7
+# The column of the CSV files which is used for transient time.
+CSV_TIME_COL = 0
+# The column of the CSV files which is used for substrate current.
+CSV_CURRENT_COL = 6
+# The suffix of the names of the Atlas logs of current over time, written by Main.in.
+LOG_FILENAME_SUFFIX = "_time.log"
+# The keyword that starts the lines of the header of an Atlas time log which declare its quantities,
+# one per line, in the order of its columns.
+LOG_QUANTITY_KEYWORD = "Q"
+# The quantities read from Atlas time logs, which are also the headers given to their columns. They
+# are looked up in the header of a log by name, without the units, ignoring case.
+LOG_HEADER = ("Transient Time (s)", "substrate Current (A)")
+# The methods that can be used to integrate the current over time.
+INTEGRATION_METHODS = ("rectangle", "trapezoid")
+# The name of the directory, inside of an experiment, to cache parsed CSV files in.
+CACHE_DIR_NAME = ".exportcache"
+# The extension of files in the cache.
+CACHE_FILE_EXT = ".npz"
+# The path to write the workbook to.
+WORKBOOK_PATH = "Charge Data.xlsx"
+# The path to write the manifest of the workbook to, which is used for incremental exports.
+MANIFEST_PATH = "Charge Data.manifest.json"
+# The main namespace of the XML parts of an .xlsx file.
+SHEET_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+# The namespace of relationship attributes in the XML parts of an .xlsx file.
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+# The layouts of the local file header, central directory header, and end of central directory
+# records of a zip file, for copying members between zip files without recompressing them.
+ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+ZIP_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+ZIP_END_RECORD = struct.Struct("<4s4H2LH")
+# The largest size, offset, and number of members that a zip file can hold without ZIP64 records.
+ZIP_MAX_SIZE = 0xFFFFFFFF
+ZIP_MAX_MEMBERS = 0xFFFF
+# The name of the file to save the index of the experiments in a data directory to.
+EXPERIMENT_INDEX_FILENAME = ".experiments.json"
+# The methods that can be used to decimate waveforms for display.
+DECIMATION_METHODS = ("lttb", "minmax")
+# The number of functions to print the profile of, when profiling an export.
+PROFILE_NUM_PRINTED = 20
+# The width given to columns holding numbers or formulas. This is about how wide Excel's "General"
+# number format is.
+NUMBER_CELL_WIDTH = 12
+# The most rows that a sheet can have, in Excel.
+MAX_SHEET_ROWS = 1048576
+# The families of figures that can be plotted.
+PLOT_FAMILIES = ("charge-vs-lifetime", "charge-vs-density", "current-vs-time", "waveforms")
+# The formats that figures can be saved in.
+PLOT_FORMATS = ("png", "svg")
+# The default directory to save figures to.
+DEFAULT_PLOT_DIR = "Charge Plots"
+# The name of the file, inside of the figure directory, that the hashes of the figures in it are
+# saved to, so that figures whose inputs haven't changed aren't drawn again.
+PLOT_CACHE_FILENAME = ".plotcache.json"
+# The size of figures, in inches.
+PLOT_FIGURE_SIZE = (6.4, 4.0)
+# The default number of points that waveforms are decimated down to for plotting. Drawing millions
+# of points takes a long time, and doesn't look any different.
+DEFAULT_PLOT_MAX_POINTS = 2000
+# The ways that the run sheets of a sharded export can be split between workbooks: a workbook for
+# each device and voltage, or workbooks capped at a number of cells.
+SHARD_METHODS = ("device-voltage", "cells")
+# The default number of cells to cap the workbooks of a sharded export at.
+DEFAULT_SHARD_CELLS = 2000000
+# The number of columns in a run sheet, for estimating how many cells it will have.
+RUN_SHEET_COLUMNS = 4
+# The columnar formats that an export can also be written in, alongside the workbook.
+COLUMNAR_FORMATS = ("parquet", "npz")
+# The paths to write the columnar tables to, without their extensions: a long table with every point
+# of every run, and a summary table with a row for every run.
+COLUMNAR_DATA_PATH = "Charge Data"
+COLUMNAR_SUMMARY_PATH = "Charge Data Summary"
+# The path to write the results store to, which collects the results of every experiment exported.
+RESULTS_STORE_PATH = "Results.sqlite"
+# The parameters of runs in the results store, which it's indexed on.
+RESULTS_STORE_PARAMETERS = ("device", "length", "dopant_type", "dopant_concentration", "voltage",
+                            "lifetime", "density")
+# The schema of the results store. Waveforms are stored as arrays of 64-bit floats, in the byte
+# order of the machine that stored them.
+RESULTS_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+  id INTEGER PRIMARY KEY,
+  path TEXT NOT NULL UNIQUE,
+  name TEXT NOT NULL,
+  exported TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+  id INTEGER PRIMARY KEY,
+  experiment_id INTEGER NOT NULL REFERENCES experiments (id) ON DELETE CASCADE,
+  path TEXT NOT NULL UNIQUE,
+  size INTEGER NOT NULL,
+  mtime INTEGER NOT NULL,
+  device TEXT NOT NULL,
+  length NUMERIC NOT NULL,
+  dopant_type TEXT NOT NULL,
+  dopant_concentration REAL NOT NULL,
+  voltage NUMERIC NOT NULL,
+  lifetime REAL NOT NULL,
+  density REAL NOT NULL,
+  integral REAL,
+  {pulse_columns}
+);
+{parameter_indices}
+CREATE INDEX IF NOT EXISTS runs_experiment_id ON runs (experiment_id);
+CREATE TABLE IF NOT EXISTS waveforms (
+  run_id INTEGER PRIMARY KEY REFERENCES runs (id) ON DELETE CASCADE,
+  time BLOB NOT NULL,
+  current BLOB NOT NULL
+);
+""".format(
+    pulse_columns=",\n  ".join("{} REAL".format(key) for key, _ in PULSE_METRICS),
+    parameter_indices="\n".join(
+        "CREATE INDEX IF NOT EXISTS runs_{0} ON runs ({0});".format(column)
+        for column in RESULTS_STORE_PARAMETERS))
+# The columns that can be queried from the results store.
+RESULTS_QUERY_COLUMNS = ("experiment", "path") + RESULTS_STORE_PARAMETERS + ("integral",) + \
+    tuple(key for key, _ in PULSE_METRICS)
+# The columns that are queried from the results store by default.
+DEFAULT_RESULTS_QUERY_COLUMNS = ("experiment", "device", "voltage", "lifetime", "density",
+                                 "integral")
+# The inotify events for files or directories being created, or moved into a watched directory.
+INOTIFY_CREATE = 0x100
+INOTIFY_MOVED_TO = 0x80
+# The inotify events that are watched for, when watching an experiment: the above, and IN_MODIFY,
+# IN_CLOSE_WRITE, IN_MOVED_FROM, and IN_DELETE. See inotify(7).
+INOTIFY_MASK = INOTIFY_CREATE | INOTIFY_MOVED_TO | 0x2 | 0x8 | 0x40 | 0x200
+# The inotify flag set on events about directories.
+INOTIFY_IS_DIR = 0x40000000
+# The inotify flag set on events when a watch is removed, like when its directory is deleted.
+INOTIFY_IGNORED = 0x8000
+# The format of the fixed-size part of an inotify event: the watch descriptor, mask, cookie, and
+# the length of the name that follows.
+INOTIFY_EVENT_FORMAT = "iIII"
+
+
+def sort_alphanumeric(data):
+  """See: https://stackoverflow.com/a/48030307
+  """
+
+  def convert(text): return int(text) if text.isdigit() else text.lower()
+  def alphanum_key(key): return [convert(c)
+                                 for c in re.split("([0-9]+)", key)]
+  return sorted(data, key=alphanum_key)
+
+
+def shorten_exp_notation(s):
+  """Force exponential notation with 1 sigfig, strip leading 0s in the exponent of exponential
+  notation, and strip unneeded "+".
+  """
+  return re.sub(r"e(\+)?(-)?0+(.+)", r"e\2\3", format(s, "1.0e"))
+
+
+def voltage_label(voltage):
+  """Returns the label used for a voltage in the sheets, e.g. "10V".
+  """
+  return "{}V".format(voltage)
+
+
+def lifetime_label(lifetime):
+  """Returns the label used for a lifetime in the sheets, e.g. "τ=1e-7".
+  """
+  return "τ={}".format(shorten_exp_notation(lifetime))
+
+
+def density_label(density):
+  """Returns the label used for a density in the sheets, e.g. "D=1e-4".
+  """
+  return "D={}".format(shorten_exp_notation(density))
+
+
+def run_sheet_name(device, voltage, lifetime, density):
+  """Returns the title of the sheet holding a run.
+  """
+  return "{} {} {} {}".format(
+      device, voltage_label(voltage), lifetime_label(lifetime), density_label(density))
+
+
+class RunRecord(collections.namedtuple("RunRecord", (
+        "device", "length", "dopant_type", "dopant_concentration", "voltage", "lifetime",
+        "density"))):
+  """The parameters of a run, as given by the name of its file. Every parameter is stored as a
+  number, other than the device and dopant type, and the labels shown for them in the sheets are
+  only formatted when asked for.
+  """
+  __slots__ = ()
+
+  @property
+  def voltage_label(self):
+    return voltage_label(self.voltage)
+
+  @property
+  def lifetime_label(self):
+    return lifetime_label(self.lifetime)
+
+  @property
+  def density_label(self):
+    return density_label(self.density)
+
+  @property
+  def sheet_name(self):
+    return run_sheet_name(self.device, self.voltage, self.lifetime, self.density)
+
+  @property
+  def coords(self):
+    """The (device, voltage, lifetime, density) of the run's slot in an index, with the lifetime
+    and density rounded to what is shown in their labels, so that runs with the same label share a
+    slot.
+    """
+    return (self.device, self.voltage, label_value(self.lifetime), label_value(self.density))
+
+
+def label_value(value):
+  """Rounds a lifetime or density to the single significant figure that is shown in its label.
+  """
+  return float(shorten_exp_notation(value))
+
+
+def parse_number(s):
+  """Parses a number from a file name, as an int if it's a whole number, or a float otherwise.
+  """
+  number = float(s)
+  return int(number) if number.is_integer() else number
+
+
+def parse_run_filename(path):
+  """Extracts the parameters of a run from the name of its CSV file or time log, which are named by
+  Main.in. The name is made of fields delimited by underscores, which are matched in one pass.
+  Fields that aren't recognized, like the "_time" suffix, are skipped. Returns a RunRecord, with
+  the defaults of Main.in filled in for the parameters that it leaves out of the name when they
+  aren't changed, and every number as it's written in the name. Raises ValueError if the device
+  is missing.
+  """
+  fields = {}
+  for match in RUN_FILENAME_FIELD_RE.finditer(os.path.basename(path)):
+    fields.setdefault(match.lastgroup, match.group(match.lastgroup))
+
+  if "device" not in fields:
+    raise ValueError(
+        "Device name could not be extracted from file \"{}\". Looked for \"PC\" or \"Diode\" \
+in file name.".format(path))
+
+  device = fields["device"]
+  return RunRecord(
+      device=device,
+      length=parse_number(fields.get("length", DEFAULT_SI_LENGTH)),
+      dopant_type=fields.get("dopant_type", DEFAULT_DOPANT_TYPE),
+      dopant_concentration=float(fields.get("dopant_concentration",
+                                            DEFAULT_DOPANT_CONCENTRATIONS[device])),
+      voltage=parse_number(fields.get(VOLTAGE_FILENAME_STR, DEFAULT_VOLTAGE)),
+      lifetime=float(fields.get(LIFETIME_FILENAME_STR, DEFAULT_LIFETIME)),
+      density=float(fields.get(DENSITY_FILENAME_STR, DEFAULT_DENSITY)))
+
+
+class RunIndex:
+  """An index of the runs of an experiment. Each parameter of a run (device, voltage, lifetime, and
+  density) is an axis, holding the sorted values of that parameter across every run. Every
+  combination of those values has a slot in a set of dense arrays, so that looking a run up is a
+  matter of indexing, and a slice along any axis is a plain NumPy slice:
+  - paths: The path of the run's CSV file, or None if there is no such run.
+  - integrals: The run's sum of integrals, or NaN if it hasn't been integrated.
+  """
+
+  AXES = ("device", "voltage", "lifetime", "density")
+
+  def __init__(self, runs):
+    """Builds an index from (device, voltage, lifetime, density, path) tuples.
+    """
+    runs = list(runs)
+    self.axes = {axis: sorted({run[axis_n] for run in runs})
+                 for axis_n, axis in enumerate(self.AXES)}
+    # Map the values of each axis back to their positions, so that lookups are O(1).
+    self._positions = {axis: {value: n for n, value in enumerate(values)}
+                       for axis, values in self.axes.items()}
+    shape = tuple(len(self.axes[axis]) for axis in self.AXES)
+    self.paths = np.full(shape, None, dtype=object)
+    self.integrals = np.full(shape, np.nan)
+    for *coords, path in runs:
+      self.paths[self.locate(*coords)] = path
+
+  def __iter__(self):
+    """Iterates over every run, in order, as (device, voltage, lifetime, density, path) tuples.
+    """
+    # np.nonzero goes through the slots in row-major order, which is sorted by every axis in turn.
+    for position in zip(*np.nonzero(self.occupied)):
+      yield tuple(self.axes[axis][n] for axis, n in zip(self.AXES, position)) + \
+          (self.paths[position],)
+
+  @property
+  def occupied(self):
+    """A boolean array of which slots have a run.
+    """
+    return np.not_equal(self.paths, None)
+
+  def locate(self, device, voltage, lifetime, density):
+    """Returns the position of a run's slot in the arrays.
+    """
+    return tuple(self._positions[axis][value]
+                 for axis, value in zip(self.AXES, (device, voltage, lifetime, density)))
+
+  def select(self, **values):
+    """Returns an index into the arrays which fixes the given axes to the given values, and spans
+    the rest. For example, index.integrals[index.select(device="PC")] is indexed by
+    [voltage, lifetime, density].
+    """
+    return tuple(self._positions[axis][values[axis]] if axis in values else slice(None)
+                 for axis in self.AXES)
+
+  def pool(self):
+    """Lays out the runs into the rows and columns of a table, as used by the all integrals sheet.
+    Every (voltage, lifetime) pair that has a run for any device gets a row, and every density gets
+    a column. Rows and columns are numbered from 1, and labelled as they are in the sheets.
+    """
+    row_mappings = {}
+    rows = np.argwhere(self.occupied.any(axis=(0, 3)))
+    for row, (voltage_n, lifetime_n) in enumerate(rows, 1):
+      lifetimes = row_mappings.setdefault(voltage_label(self.axes["voltage"][voltage_n]), {})
+      lifetimes[lifetime_label(self.axes["lifetime"][lifetime_n])] = row
+    col_mappings = {density_label(density): col
+                    for col, density in enumerate(self.axes["density"], 1)}
+    return {"row_mappings": row_mappings, "col_mappings": col_mappings}
+
+
+def grid_to_rows(grid):
+  """Converts a sparse grid of cell values, keyed by 1-indexed (row, column) tuples, into a list of
+  rows that can be appended to a worksheet.
+  """
+  if not grid:
+    return []
+  max_row = max(row for row, _ in grid)
+  max_col = max(col for _, col in grid)
+  return [[grid.get((row, col)) for col in range(1, max_col + 1)]
+          for row in range(1, max_row + 1)]
+
+
+class ColumnWidths:
+  """Tracks the width needed by each column of a worksheet, as the cells going into it are laid
+  out, so that the columns can be sized once, without reading every cell back. Write-only
+  worksheets have to be sized this way anyways, because their columns must be set up before any
+  rows are written, and the rows can't be read back afterwards.
+  """
+
+  def __init__(self):
+    # The widths of the columns, keyed by 1-indexed column number.
+    self.widths = {}
+
+  def fit_width(self, col, width):
+    """Widens a column to be at least the given width.
+    """
+    self.widths[col] = max(self.widths.get(col, 0), width)
+
+  def fit_row(self, row):
+    """Widens the columns to fit a row of cell values.
+    """
+    for col, value in enumerate(row, 1):
+      if value:
+        self.fit_width(col, cell_width(value))
+
+  def fit_rows(self, rows):
+    """Widens the columns to fit rows of cell values.
+    """
+    for row in rows:
+      self.fit_row(row)
+
+  def fit_grid(self, grid):
+    """Widens the columns to fit a sparse grid of cell values, keyed by 1-indexed (row, column)
+    tuples.
+    """
+    for (_, col), value in grid.items():
+      if value:
+        self.fit_width(col, cell_width(value))
+
+  def apply(self, ws):
+    """Sizes the columns of a worksheet to the tracked widths.
+    """
+    # See: https://stackoverflow.com/a/35790441
+    for col, width in self.widths.items():
+      ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = width
+
+
+def cell_width(value):
+  """Returns the column width needed to display a cell value.
+  """
+  if isinstance(value, (int, float)) or value.startswith('='):
+    return NUMBER_CELL_WIDTH
+  # Add 1 to make things a little more roomy. Without this, the non-compilation sheets are pretty
+  # cramped.
+  return len(value) + 1
+
+
+def quantity_name(quantity):
+  """Returns the name of a quantity, without its units, in lowercase, e.g. "transient time" for
+  "Transient Time (s)".
+  """
+  return re.sub(r"\s*\(.*\)$", "", quantity).strip().lower()
+
+
+def find_log_columns(path, quantities):
+  """Finds the columns of the transient time and substrate current, given the quantities declared
+  by the header of an Atlas time log. Raises ValueError if either isn't declared.
+  """
+  names = [quantity_name(quantity) for quantity in quantities]
+  cols = []
+  for quantity in LOG_HEADER:
+    if quantity_name(quantity) not in names:
+      raise ValueError(
+          "Quantity \"{}\" could not be found in the header of log \"{}\". Found {}.".format(
+              quantity_name(quantity), path,
+              ", ".join("\"{}\"".format(name) for name in names) or "no quantities"))
+    cols.append(names.index(quantity_name(quantity)))
+  return cols
+
+
+def iter_log_records(path):
+  """Streams (transient time, substrate current) pairs out of an Atlas log file, like the
+  "${exp_name}_time.log" files written by Main.in. The header of the log declares its quantities on
+  lines starting with "Q", one per column, which is where the columns of the transient time and
+  substrate current are found. Data records are lines of whitespace-separated numbers. Anything
+  else, like the rest of the header, is skipped. Each line is only split as far as the columns that
+  are needed, and the quantities after them are never touched. Raises ValueError once the data
+  starts, if the header didn't declare both quantities.
+  """
+  quantities = []
+  cols = None
+  with open(path, errors="replace") as f:
+    for line in f:
+      if cols is None:
+        fields = line.split(None, 1)
+        if not fields:
+          continue
+        if fields[0] == LOG_QUANTITY_KEYWORD:
+          quantities.append(fields[1].strip() if len(fields) > 1 else "")
+          continue
+        try:
+          float(fields[0])
+        except ValueError:
+          continue
+        # This is the first data record, so the header is over.
+        cols = find_log_columns(path, quantities)
+        max_col = max(cols)
+      fields = line.split(None, max_col + 1)
+      try:
+        yield float(fields[cols[0]]), float(fields[cols[1]])
+      except (IndexError, ValueError):
+        continue
+
+
+def scan_csv_columns(path, cols):
+  """Decodes the given columns of a CSV file straight into floats, without tokenizing any of the
+  other fields. The file is memory-mapped, and the fields are located by finding every newline and
+  comma in it with NumPy, rather than by splitting each row into strings. Returns the header row,
+  an array of the columns (indexed by [row, column]), and the line numbers of any malformed rows,
+  which are left out of the array.
+  """
+  with open(path, "rb") as f:
+    if os.fstat(f.fileno()).st_size == 0:
+      return [], np.empty((0, len(cols))), []
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+      data = np.frombuffer(mm, dtype=np.uint8)
+      newlines = np.flatnonzero(data == ord("\n"))
+      line_starts = np.concatenate(([0], newlines + 1))
+      line_ends = np.concatenate((newlines, [data.size]))
+      header = next(csv.reader([bytes(data[:line_ends[0]]).decode(errors="replace")]), [])
+      # Skip the header, and any blank lines, such as the one after the final newline.
+      lengths = line_ends - line_starts
+      last_chars = data[np.maximum(line_ends - 1, 0)]
+      not_blank = (lengths > 1) | ((lengths == 1) & (last_chars != ord("\r")))
+      not_blank[0] = False
+      line_numbers = np.flatnonzero(not_blank) + 1
+      line_starts, line_ends = line_starts[not_blank], line_ends[not_blank]
+
+      # Find the commas that start and end every field of interest. Rows without enough fields are
+      # malformed.
+      commas = np.flatnonzero(data == ord(","))
+      first_comma = np.searchsorted(commas, line_starts)
+      num_commas = np.searchsorted(commas, line_ends) - first_comma
+      well_formed = num_commas >= max(cols)
+      malformed = line_numbers[~well_formed].tolist()
+      line_numbers = line_numbers[well_formed]
+      line_starts, line_ends = line_starts[well_formed], line_ends[well_formed]
+      first_comma, num_commas = first_comma[well_formed], num_commas[well_formed]
+
+      columns = []
+      for col in cols:
+        if col == 0:
+          starts = line_starts
+        else:
+          starts = commas[first_comma + col - 1] + 1
+        # The last field of a row ends at the end of the line, rather than at a comma.
+        has_next_comma = num_commas > col
+        ends = np.where(has_next_comma,
+                        commas[np.minimum(first_comma + col, commas.size - 1)], line_ends)
+        # Gather the bytes of every field into a fixed-width byte string array, padded with NULs,
+        # which NumPy can convert to floats in one go. Quotes are blanked out, since float()
+        # ignores surrounding whitespace.
+        widths = ends - starts
+        offsets = np.arange(max(int(widths.max(initial=0)), 1))
+        chars = data[np.minimum(starts[:, None] + offsets, data.size - 1)]
+        chars = np.where(offsets < widths[:, None], chars, 0).astype(np.uint8)
+        chars[chars == ord('"')] = ord(" ")
+        columns.append(chars.view("S{}".format(offsets.size)).ravel())
+      # The views into the mapped file have to be released before it can be closed.
+      del data
+  values = np.empty((line_numbers.size, len(cols)))
+  valid = np.ones(line_numbers.size, dtype=bool)
+  for col_n, column in enumerate(columns):
+    try:
+      values[:, col_n] = column.astype(np.float64)
+    except ValueError:
+      # Something in this column isn't a number, so go through it one field at a time to find out
+      # what.
+      for row_n, field in enumerate(column):
+        try:
+          values[row_n, col_n] = float(field)
+        except ValueError:
+          valid[row_n] = False
+  malformed = sorted(malformed + line_numbers[~valid].tolist())
+  return header, values[valid], malformed
+
+
+def read_waveform(path):
+  """Reads the transient time and substrate current columns of a CSV file, or of an Atlas time log.
+  Returns the headers of the two columns, an array for each column, and the line numbers of any
+  malformed rows that were skipped.
+  """
+  if path.endswith(LOG_FILENAME_SUFFIX):
+    data = np.fromiter(itertools.chain.from_iterable(iter_log_records(path)),
+                       dtype=np.float64).reshape(-1, 2)
+    return list(LOG_HEADER), data[:, 0], data[:, 1], []
+  header, data, malformed = scan_csv_columns(path, (CSV_TIME_COL, CSV_CURRENT_COL))
+  if len(header) > max(CSV_TIME_COL, CSV_CURRENT_COL):
+    header = [header[CSV_TIME_COL], header[CSV_CURRENT_COL]]
+  else:
+    header = ["", ""]
+  return header, data[:, 0], data[:, 1], malformed
+
+
+def integrate_waveform(time, current, method="rectangle"):
+  """Integrates a current waveform over time, relative to the current at the start of the waveform
+  (the pedestal). With the "rectangle" method, each timestep contributes the current at its end
+  times its length, which is what the formulas in the run sheets have always done. With the
+  "trapezoid" method, the current at both ends of the timestep is averaged instead. Returns the
+  difference of the current from the start, the integral over each timestep, and their sum.
+  """
+  difference = current - current[0]
+  if method == "trapezoid":
+    integrals = (difference[1:] + difference[:-1]) / 2 * np.diff(time)
+  else:
+    integrals = difference[1:] * np.diff(time)
+  return difference, integrals, float(integrals.sum())
+
+
+def cache_file_path(cache_dir, path):
+  """Returns the path of the file that a CSV file is cached to.
+  """
+  return os.path.join(cache_dir,
+                      hashlib.sha1(os.path.abspath(path).encode()).hexdigest() + CACHE_FILE_EXT)
+
+
+def load_cached_waveform(cache_dir, path):
+  """Loads a waveform that was cached by save_cached_waveform. Returns a dictionary of the headers,
+  the time and current arrays, the line numbers of malformed rows, and the integral for every
+  integration method, or None if the CSV file isn't cached, or has changed since it was cached.
+  """
+  stat = os.stat(path)
+  try:
+    with np.load(cache_file_path(cache_dir, path)) as cached:
+      if cached["size"] != stat.st_size or cached["mtime"] != stat.st_mtime_ns:
+        return None
+      waveform = {"header": cached["header"].tolist(), "time": cached["time"],
+                  "current": cached["current"], "malformed": cached["malformed"].tolist()}
+      for method in INTEGRATION_METHODS:
+        waveform["integral_" + method] = float(cached["integral_" + method])
+      return waveform
+  except (OSError, KeyError, ValueError):
+    # The file doesn't exist, is corrupted, or is from an older version of this script.
+    return None
+
+
+def save_cached_waveform(cache_dir, path, stat, header, time, current, malformed):
+  """Caches the headers, the time and current arrays, and the line numbers of malformed rows read
+  from a CSV file, along with their integral for every integration method, which is NaN if there
+  are too few rows to integrate. The size and modification time of the CSV file, from stat, are
+  saved alongside them, so that the cache can be invalidated when the file changes. stat must be
+  taken before the file is read, so that a file that grows while it's being read, like a time log
+  that is still being written, is never cached as complete.
+  """
+  integrals = {}
+  for method in INTEGRATION_METHODS:
+    integrals["integral_" + method] = \
+        integrate_waveform(time, current, method)[2] if time.size >= 2 else np.nan
+  cache_file = cache_file_path(cache_dir, path)
+  # Write to a temporary file first, so that an interrupted export can't leave a partial file.
+  tmp_file = cache_file + ".tmp"
+  with open(tmp_file, "wb") as f:
+    np.savez(f, header=np.array(header), time=time, current=current,
+             malformed=np.array(malformed, dtype=np.int64), size=stat.st_size,
+             mtime=stat.st_mtime_ns, **integrals)
+  os.replace(tmp_file, cache_file)
+
+
+def open_cache(exp_dir):
+  """Creates the cache of an experiment, if it doesn't exist yet. Returns the directory of the
+  cache, or None, after warning about it, if it can't be written to, like when the experiment is
+  on read-only storage.
+  """
+  cache_dir = os.path.join(exp_dir, CACHE_DIR_NAME)
+  try:
+    os.makedirs(cache_dir, exist_ok=True)
+    writable = os.access(cache_dir, os.W_OK)
+  except OSError:
+    writable = False
+  if not writable:
+    print(Fore.YELLOW + "Unable to write to the cache in \"{}\". Not caching parsed files."
+          .format(cache_dir))
+    return None
+  return cache_dir
+
+
+def prune_cache(cache_dir, paths):
+  """Evicts every file from the cache which doesn't belong to one of the given CSV files, such as
+  ones for CSV files which have since been deleted or renamed, or temporary files left behind.
+  """
+  keep = {os.path.basename(cache_file_path(cache_dir, path)) for path in paths}
+  for name in os.listdir(cache_dir):
+    if name not in keep:
+      os.remove(os.path.join(cache_dir, name))
+
+
+def load_manifest(path):
+  """Loads the manifest written by the last export, or returns None if there isn't a usable one.
+  """
+  try:
+    with open(path, encoding="utf-8") as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return None
+
+
+def workbook_sheet_parts(zf):
+  """Maps the title of every sheet in an opened .xlsx file to the path of the part that holds it.
+  """
+  rels = ElementTree.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+  targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+  workbook = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+  parts = {}
+  for sheet in workbook.iter("{{{}}}sheet".format(SHEET_MAIN_NS)):
+    target = targets[sheet.get("{{{}}}id".format(REL_NS))]
+    # Targets are either absolute, or relative to the workbook part.
+    parts[sheet.get("name")] = target[1:] if target.startswith("/") else "xl/" + target
+  return parts
+
+
+def splice_sheets(new_path, old_path, titles, out_path):
+  """Writes a copy of a workbook with the parts of the given sheets copied over from an older
+  workbook. This relies on the sheets being self-contained: openpyxl writes strings inline, rather
+  than to a table shared between sheets, and the run sheets have no charts or styles that would need
+  to be copied along with them. The parts are copied compressed, as they are, unless the workbook is
+  too large to be written without ZIP64 records, in which case they're recompressed by zipfile.
+  """
+  with zipfile.ZipFile(new_path) as new_zf, zipfile.ZipFile(old_path) as old_zf, \
+          open(new_path, "rb") as new_file, open(old_path, "rb") as old_file:
+    new_parts = workbook_sheet_parts(new_zf)
+    old_parts = workbook_sheet_parts(old_zf)
+    replacements = {new_parts[title]: old_parts[title] for title in titles}
+    members = []
+    for info in new_zf.infolist():
+      if info.filename in replacements:
+        members.append((old_file, old_zf.getinfo(replacements[info.filename]), info.filename))
+      else:
+        members.append((new_file, info, info.filename))
+
+    total_size = sum(info.compress_size + 2*len(name.encode()) + ZIP_LOCAL_HEADER.size +
+                     ZIP_CENTRAL_HEADER.size for _, info, name in members)
+    if len(members) <= ZIP_MAX_MEMBERS and total_size <= ZIP_MAX_SIZE and \
+            all(info.file_size <= ZIP_MAX_SIZE for _, info, _ in members):
+      copy_zip_members(members, out_path)
+      return
+    with zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED) as out_zf:
+      for info in new_zf.infolist():
+        if info.filename in replacements:
+          out_zf.writestr(info, old_zf.read(replacements[info.filename]))
+        else:
+          out_zf.writestr(info, new_zf.read(info))
+
+
+def copy_zip_members(members, out_path):
+  """Writes a zip file made of members of other zip files, given as tuples of the zip file opened
+  in binary mode, the ZipInfo of the member, and the name to give it, copying the compressed bytes
+  of the members as they are, rather than decompressing and recompressing them like zipfile would.
+  The zip file must be small enough to not need ZIP64 records.
+  """
+  central_headers = []
+  with open(out_path, "wb") as out_file:
+    for file, info, name in members:
+      file.seek(info.header_offset)
+      local_header = ZIP_LOCAL_HEADER.unpack(file.read(ZIP_LOCAL_HEADER.size))
+      name_len, extra_len = local_header[-2:]
+      file.seek(name_len + extra_len, os.SEEK_CUR)
+      data = file.read(info.compress_size)
+
+      encoded_name = name.encode()
+      # The sizes and CRC are written up front, so there's no data descriptor after the data.
+      flags = info.flag_bits & ~0x08
+      if not encoded_name.isascii():
+        flags |= 0x800
+      year, month, day, hour, minute, second = info.date_time
+      dos_time = hour << 11 | minute << 5 | second // 2
+      dos_date = (year - 1980) << 9 | month << 5 | day
+      offset = out_file.tell()
+      out_file.write(ZIP_LOCAL_HEADER.pack(
+          b"PK\x03\x04", info.extract_version, flags, info.compress_type, dos_time, dos_date,
+          info.CRC, info.compress_size, info.file_size, len(encoded_name), 0))
+      out_file.write(encoded_name)
+      out_file.write(data)
+      central_headers.append(ZIP_CENTRAL_HEADER.pack(
+          b"PK\x01\x02", info.create_system << 8 | info.create_version, info.extract_version,
+          flags, info.compress_type, dos_time, dos_date, info.CRC, info.compress_size,
+          info.file_size, len(encoded_name), 0, 0, 0, info.internal_attr, info.external_attr,
+          offset) + encoded_name)
+
+    central_offset = out_file.tell()
+    for header in central_headers:
+      out_file.write(header)
+    out_file.write(ZIP_END_RECORD.pack(b"PK\x05\x06", 0, 0, len(members), len(members),
+                                       out_file.tell() - central_offset, central_offset, 0))
+
+
+def decimate_lttb(x, y, max_points):
+  """Picks out the indices of at most max_points points of a line to display, using the Largest
+  Triangle Three Buckets algorithm, which preserves the shape of the line well. The first and last
+  points are always kept, and the points in between are split into buckets, out of which the point
+  forming the largest triangle with the previously picked point and the average of the next bucket
+  is picked. See: https://skemman.is/bitstream/1946/15343/3/SS_MSthesis.pdf.
+  """
+  if x.size <= max_points or max_points < 3:
+    return np.arange(x.size)
+  edges = np.linspace(1, x.size - 1, max_points - 1).astype(np.int64)
+  keep = np.empty(max_points, dtype=np.int64)
+  keep[0] = 0
+  keep[-1] = x.size - 1
+  picked = 0
+  for bucket_n in range(max_points - 2):
+    start, end = edges[bucket_n], edges[bucket_n + 1]
+    # The last bucket is followed by the last point, rather than by another bucket.
+    next_end = edges[bucket_n + 2] if bucket_n + 2 < edges.size else x.size
+    next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+    # This is twice the area of each triangle, which doesn't matter for comparing them.
+    areas = np.abs((x[picked] - next_x) * (y[start:end] - y[picked]) -
+                   (x[picked] - x[start:end]) * (next_y - y[picked]))
+    picked = start + int(np.argmax(areas))
+    keep[bucket_n + 1] = picked
+  return keep
+
+
+def decimate_minmax(x, y, max_points):
+  """Picks out the indices of at most max_points points of a line to display, by splitting the
+  points into buckets, and keeping the lowest and highest point of each bucket. The first and last
+  points are always kept. This is cruder than LTTB, but never misses a peak.
+  """
+  if x.size <= max_points or max_points < 4:
+    return np.arange(x.size)
+  edges = np.linspace(1, x.size - 1, (max_points - 2) // 2 + 1).astype(np.int64)
+  keep = [0]
+  for start, end in zip(edges[:-1], edges[1:]):
+    bucket = y[start:end]
+    keep += sorted({start + int(np.argmin(bucket)), start + int(np.argmax(bucket))})
+  keep.append(x.size - 1)
+  return np.array(keep, dtype=np.int64)
+
+
+def crossing_time(time, signal, level, peak_n, rising):
+  """Finds the time at which a pulse crosses a level, on the rising edge before its peak, or on the
+  falling edge after it, interpolating between the points on either side. Returns NaN if the pulse
+  never crosses the level on that edge.
+  """
+  if rising:
+    below = np.flatnonzero(signal[:peak_n] < level)
+    if below.size == 0:
+      return np.nan
+    before = below[-1]
+  else:
+    below = np.flatnonzero(signal[peak_n:] < level)
+    if below.size == 0:
+      return np.nan
+    before = peak_n + below[0] - 1
+  after = before + 1
+  return float(time[before] + (level - signal[before]) * (time[after] - time[before]) /
+               (signal[after] - signal[before]))
+
+
+def pulse_metrics(time, current):
+  """Measures the pulse of a waveform. The baseline is the mean current of the pedestal, before the
+  single-event upset, and everything else is measured relative to it, so that the pulse can go in
+  either direction. The peak is the point furthest from the baseline. The rise time is from 10% to
+  90% of the peak, on the leading edge, and the fall time is from 90% to 10%, on the trailing edge.
+  The collected charge is the integral of the current above the baseline, from the start of the
+  single-event upset. Times that can't be measured, such as the fall time of a pulse that hasn't
+  fallen by the end of the simulation, are NaN.
+  """
+  pedestal = time < TIME_EVENT_START
+  baseline = float(current[pedestal].mean()) if pedestal.any() else float(current[0])
+  signal = current - baseline
+  peak_n = int(np.argmax(np.abs(signal)))
+  # Flip negative pulses, so that every edge can be looked for in the same way.
+  if signal[peak_n] < 0:
+    signal = -signal
+  amplitude = signal[peak_n]
+  rise_start = crossing_time(time, signal, 0.1 * amplitude, peak_n, True)
+  rise_end = crossing_time(time, signal, 0.9 * amplitude, peak_n, True)
+  fall_start = crossing_time(time, signal, 0.9 * amplitude, peak_n, False)
+  fall_end = crossing_time(time, signal, 0.1 * amplitude, peak_n, False)
+  half_start = crossing_time(time, signal, 0.5 * amplitude, peak_n, True)
+  half_end = crossing_time(time, signal, 0.5 * amplitude, peak_n, False)
+  after_event = time >= TIME_EVENT_START
+  charge = current[after_event] - baseline
+  charge = float(np.sum((charge[1:] + charge[:-1]) * np.diff(time[after_event])) / 2)
+  return {"baseline": baseline, "peak": float(current[peak_n]), "peak_time": float(time[peak_n]),
+          "rise_time": rise_end - rise_start, "fall_time": fall_end - fall_start,
+          "fwhm": half_end - half_start, "charge": charge}
+
+
+def load_waveform(path, cache_dir=None):
+  """Loads the transient time and substrate current arrays of a run, from the cache if they're in
+  it, or otherwise from its CSV file or time log.
+  """
+  cached = load_cached_waveform(cache_dir, path) if cache_dir else None
+  if cached:
+    return cached["time"], cached["current"]
+  _, time, current, _ = read_waveform(path)
+  return time, current
+
+
+def resample_grid(waveforms, num_points=None):
+  """Builds a shared time grid for (time, current) waveforms to be resampled onto. The grid is the
+  union of the timesteps of every waveform, so that none of the adaptive timesteps Atlas took are
+  lost, or num_points evenly spaced points, if given. Either way, it only spans the time covered by
+  every waveform, so nothing is extrapolated.
+  """
+  start = max(time[0] for time, _ in waveforms)
+  end = min(time[-1] for time, _ in waveforms)
+  if num_points:
+    return np.linspace(start, end, num_points)
+  grid = np.unique(np.concatenate([time for time, _ in waveforms]))
+  return grid[(grid >= start) & (grid <= end)]
+
+
+def resample_waveforms(waveforms, grid):
+  """Interpolates (time, current) waveforms onto a time grid from resample_grid(), and stacks them
+  into a 2-D array, indexed by [waveform, time].
+  """
+  stacked = np.empty((len(waveforms), grid.size))
+  for waveform_n, (time, current) in enumerate(waveforms):
+    stacked[waveform_n] = np.interp(grid, time, current)
+  return stacked
+
+
+def waveform_table_rows(grid, table, labels):
+  """Lays out a stack of waveforms on a shared time grid, indexed by [waveform, time], as rows for a
+  sheet, with the time in the first column, and a column for each waveform. Values that aren't
+  finite, like from dividing by 0, are left blank.
+  """
+  values = np.column_stack((grid, table.T))
+  cells = values.astype(object)
+  cells[~np.isfinite(values)] = None
+  return [["Time (s)"] + labels] + cells.tolist()
+
+
+def check_waveform(path, time_event_start=TIME_EVENT_START, pulse_width=PULSE_WIDTH):
+  """Checks the waveform of a run for problems that would make its export meaningless: malformed
+  rows, NaNs, time that doesn't always increase, too few points in the pulse window to resolve the
+  pulse, and simulations that ended early. The pulse window is given by the time that the
+  single-event upset starts at and the width of the window, which default to those of Main.in.
+  Returns a list of the problems found, as messages.
+  """
+  problems = []
+  try:
+    _, time, current, malformed = read_waveform(path)
+  except ValueError as e:
+    return [str(e)]
+  if malformed:
+    problems.append("{} malformed row(s), on line(s) {}.".format(
+        len(malformed), ", ".join(str(line) for line in malformed)))
+  if time.size < 2:
+    problems.append("Only {} row(s) of data.".format(time.size))
+    return problems
+  nans = np.isnan(time) | np.isnan(current)
+  if nans.any():
+    problems.append("{} row(s) with NaN, starting at data row {}.".format(
+        np.count_nonzero(nans), np.argmax(nans) + 1))
+  steps = np.diff(time)
+  backwards = ~(steps > 0) & ~np.isnan(steps)
+  if backwards.any():
+    first = int(np.argmax(backwards))
+    problems.append("Time doesn't increase at {} row(s), starting at data row {} ({} s to {} s)."
+                    .format(np.count_nonzero(backwards), first + 2, time[first], time[first + 1]))
+  time_pulse_end = time_event_start + pulse_width
+  num_pulse_points = np.count_nonzero((time >= time_event_start) & (time <= time_pulse_end))
+  if num_pulse_points < MIN_PULSE_POINTS:
+    problems.append("Only {} point(s) in the pulse window, from {} s to {} s, out of the {} \
+expected.".format(num_pulse_points, time_event_start, time_pulse_end, MIN_PULSE_POINTS))
+  # Allow for the end time being printed with fewer significant figures.
+  if np.nanmax(time) < 2 * time_pulse_end * (1 - 1e-6):
+    problems.append("Ends at {} s, before {} s.".format(np.nanmax(time), 2 * time_pulse_end))
+  return problems
+
+
+def reduce_waveform(path, method="rectangle", cache_dir=None, max_points=None,
+                    decimation="lttb"):
+  """Reads a waveform from a CSV file, and integrates it. This is all of the work done for a run
+  before it is written to the workbook, so that it can be done in a worker process. If cache_dir is
+  given, the CSV file is only parsed if it has no valid entry in the cache. If max_points is given,
+  the arrays are then decimated down to that many points, with the given method, for display. The
+  integral and the pulse metrics are always taken over the full waveform. Returns a dictionary of
+  the run's arrays, integral, and pulse metrics, and the line numbers of malformed rows that were
+  skipped, or None if the file doesn't have enough data to integrate. The dictionary also has
+  statistics about the work that was done, for the metrics of the export.
+  """
+  wall_start, cpu_start = perf_counter(), process_time()
+  cached = load_cached_waveform(cache_dir, path) if cache_dir else None
+  if cached:
+    header, time, current = cached["header"], cached["time"], cached["current"]
+    malformed = cached["malformed"]
+  else:
+    stat = os.stat(path)
+    header, time, current, malformed = read_waveform(path)
+    if cache_dir:
+      save_cached_waveform(cache_dir, path, stat, header, time, current, malformed)
+  if time.size < 2:
+    return None
+  stats = {"rows": time.size, "bytes": 0 if cached else stat.st_size, "cached": bool(cached)}
+  difference, integrals, integral = integrate_waveform(time, current, method)
+  if cached:
+    integral = cached["integral_" + method]
+  pulse = pulse_metrics(time, current)
+  decimated = bool(max_points) and time.size > max_points
+  if decimated:
+    if decimation == "minmax":
+      keep = decimate_minmax(time, current, max_points)
+    else:
+      keep = decimate_lttb(time, current, max_points)
+    # Lump the integrals over the timesteps that were dropped in with the next point that was kept,
+    # so that the integrals that are displayed still add up to the full integral.
+    cumulative_integrals = np.concatenate(([0], np.cumsum(integrals)))
+    integrals = np.diff(cumulative_integrals[keep])
+    time, current, difference = time[keep], current[keep], difference[keep]
+  stats["wall_time"] = perf_counter() - wall_start
+  stats["cpu_time"] = process_time() - cpu_start
+  stats["peak_rss"] = peak_rss()
+  return {"header": header, "time": time, "current": current, "difference": difference,
+          "integrals": integrals, "integral": integral, "pulse": pulse, "malformed": malformed,
+          "decimated": decimated, "stats": stats}
+
+
+def map_ordered(func, items, jobs=1):
+  """Maps a function over a list of items, yielding the results in order. If jobs is more than 1,
+  the calls are spread across a pool of that many processes. Only a couple of calls per process are
+  kept in flight, so that results waiting to be consumed don't pile up in memory.
+  """
+  if jobs <= 1:
+    for item in items:
+      yield func(item)
+    return
+  with concurrent_futures.ProcessPoolExecutor(jobs) as executor:
+    pending = collections.deque()
+    for item in items:
+      pending.append(executor.submit(func, item))
+      if len(pending) >= 2 * jobs:
+        yield pending.popleft().result()
+    while pending:
+      yield pending.popleft().result()
+
+
+def waveform_rows(run, method="rectangle", formulas=False):
+  """Lays out the rows of a run sheet, from a run reduced by reduce_waveform. By default, every cell
+  holds a literal value. If formulas is True, the difference, integral, and sum of integrals
+  columns are instead written as formulas, so that the sheet can be audited in a spreadsheet
+  program. The integrals of a decimated run span timesteps that aren't in the sheet, so they are
+  always written as values.
+  """
+  time, current = run["time"], run["current"]
+  rows = [run["header"] + ["Difference from Start", "Integral", "Sum of Integrals"]]
+  if formulas:
+    integrals = [None] + run["integrals"].tolist()
+    # The first data row is row 2, because of the header, and because of not being 0-indexed.
+    for row_n, (t, i) in enumerate(zip(time.tolist(), current.tolist()), 2):
+      if run["decimated"]:
+        integral_formula = integrals[row_n - 2]
+      elif method == "trapezoid":
+        integral_formula = "=(C{1}+C{0})/2*(A{1}-A{0})".format(row_n - 1, row_n)
+      else:
+        integral_formula = "=C{1}*(A{1}-A{0})".format(row_n - 1, row_n)
+      rows.append([t, i, "=B{}-$B$2".format(row_n), integral_formula])
+    sum_of_integrals = "=SUM(D3:D{})".format(len(rows))
+  else:
+    rows += [list(row) for row in zip(time.tolist(), current.tolist(), run["difference"].tolist(),
+                                      [None] + run["integrals"].tolist())]
+    sum_of_integrals = run["integral"]
+  # The integral references the row above it, so it doesn't make sense to have one in the first
+  # row.
+  rows[1][3] = None
+  rows[1].append(sum_of_integrals)
+  return rows
+
+
+def write_run_sheet(ws, run, method="rectangle", formulas=False):
+  """Writes a run reduced by reduce_waveform to a run sheet. Returns the number of cells written.
+  """
+  rows = waveform_rows(run, method, formulas)
+  # Past the header and the first data row, which holds the sum, every row of a run sheet is all
+  # numbers or formulas, which all have the same width, so they don't need to be looked at.
+  widths = ColumnWidths()
+  widths.fit_rows(rows[:2])
+  for col in range(1, len(rows[-1]) + 1):
+    widths.fit_width(col, NUMBER_CELL_WIDTH)
+  widths.apply(ws)
+  for row in rows:
+    ws.append(row)
+  return sum(len(row) for row in rows)
+
+
+def count_lines(path):
+  """Counts the lines in a file, without parsing it.
+  """
+  with open(path, "rb") as f:
+    return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+
+
+def shard_runs(runs, method="device-voltage", max_cells=DEFAULT_SHARD_CELLS, max_points=None):
+  """Splits the runs of an index, as (device, voltage, lifetime, density, path) tuples in index
+  order, into the shards of a sharded export, either by device and voltage, or by filling each shard
+  up to max_cells. The number of cells in a run sheet is estimated from the number of lines in its
+  file, and how far it will be decimated. A run that is bigger than max_cells on its own gets a
+  shard to itself. Returns a list of (name, runs) tuples, with the runs in index order.
+  """
+  if method == "device-voltage":
+    return [("{} {}".format(device, voltage_label(voltage)), list(group))
+            for (device, voltage), group in itertools.groupby(runs, key=lambda run: run[:2])]
+  shards = []
+  num_cells = 0
+  for run in runs:
+    num_rows = count_lines(run[-1])
+    if max_points:
+      num_rows = min(num_rows, max_points + 1)
+    run_cells = num_rows * RUN_SHEET_COLUMNS
+    if not shards or (shards[-1][1] and num_cells + run_cells > max_cells):
+      shards.append(("Shard {}".format(len(shards) + 1), []))
+      num_cells = 0
+    shards[-1][1].append(run)
+    num_cells += run_cells
+  return shards
+
+
+def shard_path(name):
+  """Returns the path to write a shard of a sharded export to.
+  """
+  base, ext = os.path.splitext(WORKBOOK_PATH)
+  return "{} ({}){}".format(base, name, ext)
+
+
+def write_shard(job):
+  """Reduces the runs of a shard, and writes their run sheets to the shard's own workbook. Takes a
+  (path, runs, options) tuple, where runs is a list of (sheet name, CSV path) tuples, and options
+  are the keyword arguments of reduce_waveform, along with formulas, and keep_waveforms, so that
+  it can be mapped over a pool of processes. Returns a list with what the export needs of each run,
+  in order: its integral, pulse metrics, malformed rows, statistics, and the number of cells
+  written, along with its arrays if keep_waveforms is True, or None if it couldn't be integrated.
+  """
+  path, runs, options = job
+  options = dict(options)
+  formulas = options.pop("formulas")
+  keep_waveforms = options.pop("keep_waveforms")
+  # A shard only has run sheets, which don't have to be edited after they're written.
+  wb = openpyxl.Workbook(write_only=True)
+  results = []
+  for sheet_name, csv_path in runs:
+    run = reduce_waveform(csv_path, **options)
+    if run is None:
+      results.append(None)
+      continue
+    num_cells = write_run_sheet(wb.create_sheet(sheet_name), run, options["method"], formulas)
+    result = {key: run[key] for key in ("integral", "pulse", "malformed", "stats")}
+    result["cells"] = num_cells
+    if keep_waveforms:
+      result.update(time=run["time"], current=run["current"])
+    results.append(result)
+  if wb.sheetnames:
+    wb.save(path)
+  return results
+
+
+def make_figure(family, title, x_label, y_label, series, x_log=False, y_log=False,
+                markers=True):
+  """Describes a figure to be drawn by render_figure(). series is a list of (label, x, y) tuples,
+  with a label of None for a series that doesn't need a legend.
+  """
+  return {"family": family, "name": title, "title": title, "x_label": x_label, "y_label": y_label,
+          "x_log": x_log, "y_log": y_log, "markers": markers, "series": series}
+
+
+def plot_figures(index, waveforms, families=PLOT_FAMILIES):
+  """Lays out the figures of an experiment, from the integrals in its index, and its waveforms,
+  keyed by (device, voltage, lifetime, density). Returns a list of figures, as made by
+  make_figure().
+  """
+  figures = []
+  axes = index.axes
+  # Runs that couldn't be integrated are left out.
+  integrated = index.occupied & ~np.isnan(index.integrals)
+  if "charge-vs-lifetime" in families:
+    for device in axes["device"]:
+      for density in axes["density"]:
+        series = []
+        for voltage in axes["voltage"]:
+          lifetimes = index.select(device=device, voltage=voltage, density=density)
+          has_run = integrated[lifetimes]
+          if has_run.any():
+            series.append((voltage_label(voltage), np.array(axes["lifetime"])[has_run],
+                           index.integrals[lifetimes][has_run]))
+        if series:
+          figures.append(make_figure(
+              "charge-vs-lifetime",
+              "Charge vs. Lifetime ({} {})".format(device, density_label(density)),
+              "Lifetime (s)", "Charge", series, x_log=True))
+  if "charge-vs-density" in families:
+    for device in axes["device"]:
+      for lifetime in axes["lifetime"]:
+        series = []
+        for voltage in axes["voltage"]:
+          densities = index.select(device=device, voltage=voltage, lifetime=lifetime)
+          has_run = integrated[densities]
+          if has_run.any():
+            series.append((voltage_label(voltage), np.array(axes["density"])[has_run],
+                           index.integrals[densities][has_run]))
+        if series:
+          figures.append(make_figure(
+              "charge-vs-density",
+              "Charge vs. Density ({} {})".format(device, lifetime_label(lifetime)),
+              "Density (pC/μm)", "Charge", series, x_log=True, y_log=True))
+  if "current-vs-time" in families:
+    for coords, (time, current) in waveforms.items():
+      figures.append(make_figure(
+          "current-vs-time", "Current vs. Time ({})".format(run_sheet_name(*coords)),
+          "Time (s)", "Current (A)", [(None, time, current)], markers=False))
+  if "waveforms" in families:
+    # Overlay the waveforms of every density, for each of the other parameters.
+    overlays = {}
+    for (device, voltage, lifetime, density), (time, current) in waveforms.items():
+      overlays.setdefault((device, voltage, lifetime), []).append(
+          (density_label(density), time, np.abs(current)))
+    for (device, voltage, lifetime), series in overlays.items():
+      figures.append(make_figure(
+          "waveforms",
+          "Waveforms ({} {} {})".format(device, voltage_label(voltage), lifetime_label(lifetime)),
+          "Time (s)", "|Current| (A)", series, y_log=True, markers=False))
+  return figures
+
+
+def figure_hash(figure, formats, dpi):
+  """Hashes everything that goes into drawing a figure, including the data of every series, so that
+  a figure only has to be drawn again if its hash changes.
+  """
+  digest = hashlib.sha256()
+  digest.update(json.dumps({"figure": {key: value for key, value in figure.items()
+                                       if key != "series"},
+                            "formats": formats, "dpi": dpi}, sort_keys=True).encode())
+  for label, x, y in figure["series"]:
+    digest.update(json.dumps(label).encode())
+    digest.update(np.ascontiguousarray(x, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+  return digest.hexdigest()
+
+
+def render_figure(job):
+  """Draws a figure made by make_figure(), and saves it to each of the given paths, in the format
+  given by their extensions. Takes a (figure, paths, dpi) tuple, so that it can be mapped over a
+  pool of processes.
+  """
+  # matplotlib is only needed for plotting, so it's imported here, rather than being required by
+  # every subcommand. Figures are drawn without pyplot, so no GUI backend is ever loaded.
+  from matplotlib.figure import Figure
+
+  figure, paths, dpi = job
+  fig = Figure(figsize=PLOT_FIGURE_SIZE, dpi=dpi, constrained_layout=True)
+  ax = fig.subplots()
+  for label, x, y in figure["series"]:
+    ax.plot(x, y, label=label, marker="o" if figure["markers"] else None, markersize=3)
+  ax.set_title(figure["title"])
+  ax.set_xlabel(figure["x_label"])
+  ax.set_ylabel(figure["y_label"])
+  if figure["x_log"]:
+    ax.set_xscale("log")
+  if figure["y_log"]:
+    ax.set_yscale("log")
+  ax.grid(True, which="both", alpha=0.3)
+  if any(label is not None for label, _, _ in figure["series"]):
+    ax.legend(fontsize="small")
+  for path in paths:
+    fig.savefig(path)
+
+
+def write_parquet_tables(data_path, summary_path, runs):
+  """Writes the long and summary tables of an export as Parquet files, compressed with Zstandard.
+  runs is an iterable of (summary, time, current) tuples, where summary is a dictionary of the
+  parameters and results of a run. Every run gets its own row groups in the long table, so that a
+  run can be read without scanning the rest. Runs are written as they're iterated over, so only one
+  is held in memory at a time.
+  """
+  # pyarrow is only needed for writing Parquet, so it's imported here, rather than being required by
+  # every subcommand.
+  import pyarrow
+  import pyarrow.parquet
+
+  schema = pyarrow.schema([("device", pyarrow.string()), ("voltage", pyarrow.float64()),
+                           ("lifetime", pyarrow.float64()), ("density", pyarrow.float64()),
+                           ("time", pyarrow.float64()), ("current", pyarrow.float64())])
+  summaries = []
+  with pyarrow.parquet.ParquetWriter(data_path, schema, compression="zstd") as writer:
+    for summary, time, current in runs:
+      num_rows = time.size
+      writer.write_table(pyarrow.table([
+          pyarrow.repeat(summary["device"], num_rows),
+          pyarrow.repeat(summary["voltage"], num_rows),
+          pyarrow.repeat(summary["lifetime"], num_rows),
+          pyarrow.repeat(summary["density"], num_rows),
+          pyarrow.array(time), pyarrow.array(current)], schema=schema))
+      summaries.append(summary)
+  pyarrow.parquet.write_table(pyarrow.Table.from_pylist(summaries), summary_path,
+                              compression="zstd")
+
+
+def write_npz_tables(data_path, summary_path, runs):
+  """Writes the long and summary tables of an export as NumPy .npz files, which only need NumPy to
+  read. Rather than repeating the parameters of a run on every row, the long table has a time and a
+  current array for each run, named "time_<n>" and "current_<n>", where n is the row of the run in
+  the summary table. Since each array is compressed on its own, one run can be read without
+  decompressing the rest. runs is as for write_parquet_tables().
+  """
+  summaries = []
+  with zipfile.ZipFile(data_path, "w", zipfile.ZIP_DEFLATED) as zf:
+    for run_n, (summary, time, current) in enumerate(runs):
+      for name, array in (("time", time), ("current", current)):
+        with zf.open("{}_{}.npy".format(name, run_n), "w", force_zip64=True) as f:
+          np.lib.format.write_array(f, np.ascontiguousarray(array, dtype=np.float64))
+      summaries.append(summary)
+  # Strings are saved as fixed-width arrays, rather than as objects, so that they can be loaded
+  # without unpickling.
+  np.savez_compressed(summary_path, **{key: np.array([summary[key] for summary in summaries])
+                                       for key in summaries[0]})
+
+
+class ExportMetrics:
+  """Records metrics about an export: the wall time, CPU time, and peak memory usage of each of its
+  phases, along with counts of the rows parsed, cells written, and bytes read in them, and the same
+  for each CSV file read. The CPU time and memory usage of a phase are only those of this process,
+  so with multiple jobs, the work done by the worker processes only shows up under the files. The
+  peak memory usage is the high-water mark of the process since it started, as of the end of the
+  phase, or of reading the file, rather than the peak within it, so a phase only shows a higher
+  peak than the ones before it if it used more memory than all of them.
+  """
+
+  def __init__(self):
+    self.phases = []
+    self.files = []
+    self.profile = None
+    self._wall_start = None
+    self._cpu_start = None
+
+  def start_phase(self, name):
+    """Ends the current phase, if any, and starts a new one.
+    """
+    self.end_phase()
+    self.phases.append({"name": name, "rows_parsed": 0, "cells_written": 0, "bytes_read": 0})
+    self._wall_start, self._cpu_start = perf_counter(), process_time()
+
+  def end_phase(self):
+    """Ends the current phase, if any.
+    """
+    if self._wall_start is None:
+      return
+    self.phases[-1]["wall_time"] = perf_counter() - self._wall_start
+    self.phases[-1]["cpu_time"] = process_time() - self._cpu_start
+    self.phases[-1]["peak_rss"] = peak_rss()
+    self._wall_start = self._cpu_start = None
+
+  def count(self, **counts):
+    """Adds to the counts of the current phase.
+    """
+    for key, value in counts.items():
+      self.phases[-1][key] += value
+
+  def add_file(self, path, stats, cells_written):
+    """Records the statistics of reading a CSV file, returned by reduce_waveform(), along with the
+    number of cells written to its run sheet, and counts them towards the current phase.
+    """
+    self.files.append(dict(path=path, cells_written=cells_written, **stats))
+    self.count(rows_parsed=stats["rows"], cells_written=cells_written, bytes_read=stats["bytes"])
+
+  def set_profile(self, profiler):
+    """Keeps the functions that a profiler saw, sorted by cumulative time, so that they can be
+    dumped as JSON.
+    """
+    self.profile = []
+    for (filename, line, function), (primitive_calls, calls, total_time, cumulative_time, _) \
+            in pstats.Stats(profiler).stats.items():
+      self.profile.append({"file": filename, "line": line, "function": function, "calls": calls,
+                           "primitive_calls": primitive_calls, "total_time": total_time,
+                           "cumulative_time": cumulative_time})
+    self.profile.sort(key=lambda entry: entry["cumulative_time"], reverse=True)
+
+  def to_dict(self):
+    """Returns every metric as a dictionary, ready to be dumped as JSON.
+    """
+    return {"phases": self.phases, "files": self.files, "profile": self.profile}
+
+
+def peak_rss():
+  """Returns the peak resident set size of this process so far, in bytes, over its whole lifetime,
+  or None if it can't be measured on this OS.
+  """
+  if resource is None:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports this in kilobytes, and macOS in bytes.
+  return peak if sys.platform == "darwin" else peak * 1024
+
+
+def open_results_store(path):
+  """Opens the results store, creating it if it doesn't exist. Returns the connection to it.
+  """
+  conn = sqlite3.connect(path)
+  conn.execute("PRAGMA foreign_keys = ON")
+  conn.executescript(RESULTS_STORE_SCHEMA)
+  return conn
+
+
+def store_experiment(conn, exp_dir):
+  """Adds an experiment to the results store, or marks it as exported again if it's already there.
+  Returns the ID of the experiment.
+  """
+  path = os.path.abspath(exp_dir)
+  conn.execute(
+      "INSERT INTO experiments (path, name, exported) VALUES (?, ?, ?) "
+      "ON CONFLICT (path) DO UPDATE SET exported = excluded.exported",
+      (path, os.path.basename(path), datetime.datetime.now().isoformat(timespec="seconds")))
+  return conn.execute("SELECT id FROM experiments WHERE path = ?", (path,)).fetchone()[0]
+
+
+def store_run(conn, experiment_id, path, stat, integral, pulse):
+  """Adds a run to the results store, or updates it if it's already there, with the parameters in
+  the name of its file, and its integral and pulse metrics. Returns the ID of the run.
+  """
+  record = parse_run_filename(path)
+  path = os.path.abspath(path)
+  columns = ("experiment_id", "path", "size", "mtime") + RESULTS_STORE_PARAMETERS + \
+      ("integral",) + tuple(key for key, _ in PULSE_METRICS)
+  values = (experiment_id, path, stat.st_size, stat.st_mtime_ns) + \
+      tuple(getattr(record, column) for column in RESULTS_STORE_PARAMETERS) + \
+      (integral,) + tuple(pulse[key] for key, _ in PULSE_METRICS)
+  conn.execute(
+      "INSERT INTO runs ({}) VALUES ({}) ON CONFLICT (path) DO UPDATE SET {}".format(
+          ", ".join(columns), ", ".join("?" * len(columns)),
+          ", ".join("{0} = excluded.{0}".format(column) for column in columns[2:])),
+      values)
+  return conn.execute("SELECT id FROM runs WHERE path = ?", (path,)).fetchone()[0]
+
+
+def store_waveform(conn, run_id, time=None, current=None):
+  """Replaces the waveform of a run in the results store, or removes it if time is None.
+  """
+  conn.execute("DELETE FROM waveforms WHERE run_id = ?", (run_id,))
+  if time is not None:
+    conn.execute("INSERT INTO waveforms (run_id, time, current) VALUES (?, ?, ?)",
+                 (run_id, np.asarray(time, dtype=np.float64).tobytes(),
+                  np.asarray(current, dtype=np.float64).tobytes()))
+
+
+def prune_results_store(conn, experiment_id, paths):
+  """Removes the runs of an experiment from the results store, other than those with the given
+  paths, so that runs which were deleted, or couldn't be integrated, don't linger.
+  """
+  paths = {os.path.abspath(path) for path in paths}
+  conn.executemany("DELETE FROM runs WHERE id = ?", [
+      (run_id,) for run_id, path in conn.execute(
+          "SELECT id, path FROM runs WHERE experiment_id = ?", (experiment_id,))
+      if path not in paths])
+
+
+def scan_experiment(exp_dir):
+  """Scans an experiment directory, and all of the directories under it, for CSV files and time
+  logs. Returns an entry for the experiment index, with the number of runs, the values of each
+  parameter that the runs cover, the total size and latest modification time of the files, and the
+  modification times of the directories scanned, which tell when the entry needs to be rescanned.
+  """
+  entry = {"dirs": {}, "files": 0, "runs": 0, "bytes": 0, "mtime": 0,
+           "axes": {axis: [] for axis in RunIndex.AXES}}
+  # A run can have both a time log and a CSV file, so runs are counted by their coordinates, in the
+  # same way that the run index keeps one file for each.
+  run_coords = set()
+  for dir_path, dir_names, file_names in os.walk(exp_dir):
+    # Skip hidden directories, like the cache, in the same way that glob does.
+    dir_names[:] = [d for d in dir_names if not d.startswith(".")]
+    entry["dirs"][os.path.relpath(dir_path, exp_dir)] = os.stat(dir_path).st_mtime_ns
+    for file_name in file_names:
+      if file_name.startswith(".") or \
+              not (file_name.endswith(".csv") or file_name.endswith(LOG_FILENAME_SUFFIX)):
+        continue
+      path = os.path.join(dir_path, file_name)
+      stat = os.stat(path)
+      entry["files"] += 1
+      entry["bytes"] += stat.st_size
+      entry["mtime"] = max(entry["mtime"], stat.st_mtime_ns)
+      try:
+        run = parse_run_filename(path)
+      except ValueError:
+        continue
+      run_coords.add(run.coords)
+      for axis, value in zip(RunIndex.AXES, run.coords):
+        if value not in entry["axes"][axis]:
+          entry["axes"][axis].append(value)
+  entry["runs"] = len(run_coords)
+  for axis in RunIndex.AXES:
+    entry["axes"][axis].sort()
+  return entry
+
+
+def experiment_is_unchanged(exp_dir, entry):
+  """Checks whether any of the directories of an experiment have been modified since it was last
+  scanned. Adding, removing, or renaming a file modifies its directory, but rewriting a file in
+  place doesn't, so this doesn't notice a file changing size.
+  """
+  for rel_dir, mtime in entry["dirs"].items():
+    try:
+      if os.stat(os.path.join(exp_dir, rel_dir)).st_mtime_ns != mtime:
+        return False
+    except OSError:
+      return False
+  return True
+
+
+def index_experiments(data_dir, refresh=False):
+  """Indexes the experiments in a data directory, keyed by name. The index is saved to the data
+  directory, and only the experiments whose directories have been modified since the last time are
+  rescanned, unless refresh is given. Every directory is indexed, even if it has no CSV files or
+  time logs, so that it isn't rescanned each time either.
+  """
+  index_path = os.path.join(data_dir, EXPERIMENT_INDEX_FILENAME)
+  previous = {} if refresh else load_manifest(index_path) or {}
+  experiments = {}
+  for dir_entry in os.scandir(data_dir):
+    if not dir_entry.is_dir() or dir_entry.name.startswith("."):
+      continue
+    entry = previous.get(dir_entry.name)
+    if not entry or not experiment_is_unchanged(dir_entry.path, entry):
+      entry = scan_experiment(dir_entry.path)
+    experiments[dir_entry.name] = entry
+  if experiments != previous:
+    # The data directory may well be read-only, in which case the index just isn't saved.
+    try:
+      tmp_path = index_path + ".tmp"
+      with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(experiments, f, indent=2)
+      os.replace(tmp_path, index_path)
+    except OSError:
+      pass
+  return experiments
+
+
+def ls(args):
+  print(Fore.GREEN + "Listing experiments...")
+  if not os.path.isdir(args.dir):
+    print(Fore.RED + "Directory \"{}\" not found.".format(args.dir))
+    os.sys.exit(1)
+  experiments = index_experiments(args.dir, args.refresh)
+  # Only consider directories with CSV files or time logs in them, which have runs with every one of
+  # the given parameters. Parameters are rounded in the same way as when exporting.
+  filters = {"device": args.device, "voltage": args.voltage,
+             "lifetime": [label_value(v) for v in args.lifetime or []] or None,
+             "density": [label_value(v) for v in args.density or []] or None}
+  names = sort_alphanumeric([
+      name for name, entry in experiments.items() if entry["files"] and
+      all(value in entry["axes"][axis]
+          for axis, values in filters.items() if values for value in values)])
+  if names:
+    print(Fore.CYAN + "Experiments:")
+    for name in names:
+      entry = experiments[name]
+      axes = entry["axes"]
+      print("- " + Fore.WHITE + Style.BRIGHT + name + Style.NORMAL +
+            ": {} runs, {:.1f} MB, modified {}".format(
+                entry["runs"], entry["bytes"] / 1e6,
+                datetime.datetime.fromtimestamp(entry["mtime"] / 1e9).strftime("%Y-%m-%d %H:%M")))
+      if entry["runs"]:
+        print(Fore.WHITE + "  - Devices: " + ", ".join(axes["device"]))
+        print(Fore.WHITE + "  - Voltages: " + ", ".join(map(voltage_label, axes["voltage"])))
+        print(Fore.WHITE + "  - Lifetimes: " + ", ".join(map(lifetime_label, axes["lifetime"])))
+        print(Fore.WHITE + "  - Densities: " + ", ".join(map(density_label, axes["density"])))
+    print(Fore.GREEN + "Success.")
+    os.sys.exit(0)
+  else:
+    print(Fore.RED + "No experiments found.")
+    os.sys.exit(1)
+
+
+def find_experiment(name):
+  """Finds the directory of an experiment, given its directory or name. Exits if it doesn't exist.
+  """
+  exp = name
+  # Provide support for only passing the name of the experiment.
+  if not os.path.exists(exp):
+    exp = os.path.join(DEFAULT_DATA_DIR, exp)
+    if not os.path.exists(exp):
+      print(Fore.RED + "Experiment \"{}\" not found.".format(name))
+      os.sys.exit(1)
+  return exp
+
+
+def index_experiment(name):
+  """Finds the CSV files and time logs of an experiment, given its directory or name, and indexes
+  the runs in them, printing every file, and why any were skipped. Exits if there are no runs.
+  Returns the directory of the experiment, and the index.
+  """
+  exp = find_experiment(name)
+  # Atlas time logs can be read directly, without being exported to CSV with Tonyplot first. They
+  # come first, so that if a log has also been exported to CSV, the CSV file is the one used.
+  csv_list = glob(exp + "/**/*" + LOG_FILENAME_SUFFIX, recursive=True) + \
+      glob(exp + "/**/*.csv", recursive=True)
+  if not csv_list:
+    print(Fore.RED + "No CSV files or time logs found.")
+    os.sys.exit(1)
+
+  print(Fore.CYAN + "CSV Files:")
+
+  runs = []
+  for f in csv_list:
+    print(Fore.WHITE + Style.BRIGHT + f)
+    try:
+      run = parse_run_filename(f)
+    except ValueError as e:
+      print(Fore.RED + "{} Skipping this file.".format(e))
+      continue
+    runs.append(run.coords + (f,))
+
+  if not runs:
+    print(Fore.RED + "Unable to create a run index.")
+    os.sys.exit(1)
+  # The index sorts every axis numerically. This is necessary because alphanumeric sorting of the
+  # file names may not account for scientific notation.
+  index = RunIndex(runs)
+  return exp, index
+
+
+def check_runs(index, jobs=1, time_event_start=TIME_EVENT_START, pulse_width=PULSE_WIDTH):
+  """Checks every run of an index for problems, and for slots in the index that are missing a run,
+  printing a report. Missing runs are only warned about, since a sweep doesn't have to cover every
+  combination of parameters. Returns the number of runs with problems.
+  """
+  num_bad_runs = 0
+  runs = list(index)
+  checked_runs = map_ordered(
+      functools.partial(check_waveform, time_event_start=time_event_start,
+                        pulse_width=pulse_width),
+      [path for *_, path in runs], jobs)
+  for (*coords, path), problems in zip(runs, checked_runs):
+    if problems:
+      num_bad_runs += 1
+      print(Fore.RED + "{} ({}):".format(run_sheet_name(*coords), path))
+      for problem in problems:
+        print(Fore.RED + "  - " + problem)
+  missing = np.argwhere(~index.occupied)
+  if missing.size:
+    print(Fore.YELLOW + "Missing {} run(s) from the grid of parameters:".format(len(missing)))
+    for position in missing:
+      print(Fore.YELLOW + "  - " + run_sheet_name(
+          *(index.axes[axis][n] for axis, n in zip(RunIndex.AXES, position))))
+  print(Fore.WHITE + "Checked {} run(s), of which {} had problems.".format(
+      len(runs), num_bad_runs))
+  return num_bad_runs
+
+
+def check(args):
+  print(Fore.GREEN + "Indexing CSV files...")
+  _, index = index_experiment(args.exp)
+  print(Fore.GREEN + "Success.")
+
+  print(Fore.GREEN + "Checking runs...")
+  if check_runs(index, args.jobs, args.time_event_start, args.pulse_width):
+    os.sys.exit(1)
+  print(Fore.GREEN + "Success.")
+  os.sys.exit(0)
+
+
+def format_query_value(value):
+  """Formats a value queried from the results store for printing.
+  """
+  if value is None:
+    return ""
+  if isinstance(value, float):
+    return "{:g}".format(value)
+  return str(value)
+
+
+def query(args):
+  if not os.path.exists(args.store):
+    print(Fore.RED + "Results store \"{}\" not found. Export an experiment first.".format(
+        args.store))
+    os.sys.exit(1)
+
+  columns = args.columns or DEFAULT_RESULTS_QUERY_COLUMNS
+  # The store has the parameters exactly as they are in the file names, so they're compared as
+  # given.
+  filters = {"experiments.name": args.experiment, "runs.device": args.device,
+             "runs.length": args.length, "runs.dopant_type": args.dopant_type,
+             "runs.voltage": args.voltage, "runs.lifetime": args.lifetime,
+             "runs.density": args.density}
+  conditions = []
+  parameters = []
+  for column, values in filters.items():
+    if values:
+      conditions.append("{} IN ({})".format(column, ", ".join("?" * len(values))))
+      parameters.extend(values)
+  sql = "SELECT {} FROM runs JOIN experiments ON experiments.id = runs.experiment_id".format(
+      ", ".join("experiments.name" if column == "experiment" else "runs." + column
+                for column in columns))
+  if conditions:
+    sql += " WHERE " + " AND ".join(conditions)
+  sql += " ORDER BY experiments.name, runs.device, runs.voltage, runs.lifetime, runs.density"
+
+  conn = sqlite3.connect(args.store)
+  rows = conn.execute(sql, parameters).fetchall()
+  conn.close()
+  if not rows:
+    print(Fore.RED + "No runs found.")
+    os.sys.exit(1)
+
+  if args.csv:
+    writer = csv.writer(sys.stdout)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    os.sys.exit(0)
+  rows = [[format_query_value(value) for value in row] for row in rows]
+  widths = [max(len(column), *(len(row[n]) for row in rows)) for n, column in enumerate(columns)]
+  print(Fore.CYAN + "  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+  for row in rows:
+    print(Fore.WHITE + "  ".join(value.ljust(width) for value, width in zip(row, widths)))
+  print(Fore.GREEN + "Found {} run(s).".format(len(rows)))
+  os.sys.exit(0)
+
+
+def plot(args):
+  if importlib.util.find_spec("matplotlib") is None:
+    print(Fore.RED + "Plotting requires matplotlib. Install it with \"pip install -r \
+requirements.txt\".")
+    os.sys.exit(1)
+
+  print(Fore.GREEN + "Indexing CSV files...")
+  exp, index = index_experiment(args.exp)
+  print(Fore.GREEN + "Success.")
+
+  print(Fore.GREEN + "Reading runs...")
+  cache_dir = None if args.no_cache else open_cache(exp)
+  runs = list(index)
+  reduced_runs = map_ordered(
+      functools.partial(reduce_waveform, method=args.integration, cache_dir=cache_dir,
+                        max_points=args.max_points),
+      [path for *_, path in runs], args.jobs)
+  # The waveforms, decimated for plotting, keyed by (device, voltage, lifetime, density).
+  waveforms = {}
+  # Like in exports, a time log whose columns can't be found stops the plot, rather than being
+  # skipped like a file that is too short.
+  try:
+    for (*coords, path), run in zip(runs, reduced_runs):
+      if run is None:
+        print(Fore.YELLOW + "Not enough data in file \"{}\" to integrate. Skipping this file."
+              .format(path))
+        continue
+      index.integrals[index.locate(*coords)] = run["integral"]
+      waveforms[tuple(coords)] = (run["time"], run["current"])
+  except ValueError as e:
+    print(Fore.RED + "{} Not plotting.".format(e))
+    os.sys.exit(1)
+  print(Fore.GREEN + "Success.")
+
+  print(Fore.GREEN + "Drawing figures...")
+  os.makedirs(args.out, exist_ok=True)
+  cache_path = os.path.join(args.out, PLOT_CACHE_FILENAME)
+  # Figures are only drawn if their inputs have changed since they were last drawn, or if any of
+  # their files are missing.
+  cache = {} if args.force else load_manifest(cache_path) or {}
+  figures = plot_figures(index, waveforms, args.families)
+  new_cache = {}
+  jobs = []
+  for figure in figures:
+    entry = {"family": figure["family"], "hash": figure_hash(figure, args.formats, args.dpi),
+             "files": ["{}.{}".format(figure["name"], fmt) for fmt in args.formats]}
+    new_cache[figure["name"]] = entry
+    unchanged = cache.get(figure["name"]) == entry and \
+        all(os.path.exists(os.path.join(args.out, f)) for f in entry["files"])
+    if not unchanged:
+      jobs.append((figure, [os.path.join(args.out, f) for f in entry["files"]], args.dpi))
+  # Remove the files of figures that are no longer drawn, like those of runs that were deleted.
+  # Figures of the families that weren't plotted this time are left alone.
+  new_files = {f for entry in new_cache.values() for f in entry["files"]}
+  for name, entry in cache.items():
+    if entry.get("family") not in args.families:
+      new_cache.setdefault(name, entry)
+      continue
+    for f in set(entry["files"]) - new_files:
+      if os.path.exists(os.path.join(args.out, f)):
+        os.remove(os.path.join(args.out, f))
+
+  if jobs:
+    print(Fore.CYAN + "Figures:")
+  for (figure, _, _), _ in zip(jobs, map_ordered(render_figure, jobs, args.jobs)):
+    print(Fore.WHITE + "- " + Style.BRIGHT + figure["name"])
+  with open(cache_path, "w", encoding="utf-8") as f:
+    json.dump(new_cache, f, ensure_ascii=False, indent=2)
+  print(Fore.WHITE + "Drew {} figure(s) to \"{}\", and skipped {} unchanged figure(s).".format(
+      len(jobs), args.out, len(figures) - len(jobs)))
+  print(Fore.GREEN + "Success.")
+  os.sys.exit(0)
+
+
+def export(args, loaded_waveforms=None):
+  """Exports an experiment to a workbook. loaded_waveforms, if given, is a dictionary that the
+  waveforms loaded for resampling are kept in, keyed by path, so that only those which are new or
+  have changed need to be loaded again by the next export.
+  """
+  if args.shard and args.incremental:
+    print(Fore.RED + "Sharded exports can't be done incrementally.")
+    os.sys.exit(1)
+  if "parquet" in args.format and importlib.util.find_spec("pyarrow") is None:
+    print(Fore.RED + "Writing Parquet requires pyarrow. Install it with \"pip install pyarrow\".")
+    os.sys.exit(1)
+
+  metrics = ExportMetrics()
+  metrics.start_phase("discovery")
+  print(Fore.GREEN + "Indexing CSV files...")
+
+  exp, index = index_experiment(args.exp)
+  print(Fore.GREEN + "Success.")
+
+  if args.check:
+    metrics.start_phase("checks")
+    print(Fore.GREEN + "Checking runs...")
+    if check_runs(index, args.jobs, args.time_event_start, args.pulse_width):
+      print(Fore.RED + "Some runs have problems. Not exporting.")
+      os.sys.exit(1)
+    print(Fore.GREEN + "Success.")
+
+  metrics.start_phase("layout")
+  print(Fore.GREEN + "Creating row and column mappings.")
+
+  # Initialize the pool. This is used to allocate rows and columns to their respective voltages,
+  # lifetimes, and densities. These attributes are all "pooled" together from different devices so
+  # that every device table will have the same rows and columns, which makes translating formulas
+  # doable.
+  #
+  # These are relative, so, in using them, you must offset them by the appropriate constant.
+  # Additionally, these are not zero-indexed, so, if adding these to another non zero-indexed Excel
+  # row/column, you will have to subtract 1.
+  pool = index.pool()
+
+  # Initialize the device pool, providing the .
+  # These are absolute!
+  device_pool = {}
+  # These two variables are relative to the first row (index 1 - spreadsheets aren't zero-indexed!)
+  # of the data portion of the table.
+  relative_row_data_start = 1
+  relative_row_data_end = sum(len(lifetimes) for lifetimes in pool["row_mappings"].values())
+  num_data_rows = relative_row_data_end - relative_row_data_start
+  # Add another device so that we can have a table for normalized Photoconductor values. They're
+  # normalized against the Diode, so this needs runs of both. Either may be missing, like while a
+  # sweep is still running.
+  has_pc = "PC" in index.axes["device"]
+  has_diode = "Diode" in index.axes["device"]
+  devices = index.axes["device"] + (["PC_Norm"] if has_pc and has_diode else [])
+  for device_n, device in enumerate(devices):
+    device_pool[device] = {}
+    # This first line just accounts for reserving space for the non data rows of this device.
+    # The next lines account for space taken by previous devices.
+    device_pool[device]["start"] = NUM_NON_DATA_ROWS + relative_row_data_start + \
+        device_n * (NUM_NON_DATA_ROWS + relative_row_data_start + num_data_rows +
+                    NUM_PADDING_CELLS)
+    device_pool[device]["end"] = device_pool[device]["start"] + num_data_rows
+  # Make note of where the next free row is, so that we can write more tables and charts there.
+  current_free_row = device_pool[devices[-1]]["end"] + 1 + NUM_PADDING_CELLS
+
+  metrics.start_phase("sheets")
+  print(Fore.GREEN + "Writing CSVs to workbook...")
+
+  # In streaming mode, every worksheet is write-only, so that rows are flushed to disk as they are
+  # appended, rather than all being held in memory until the workbook is saved. Write-only
+  # worksheets can only be appended to, so the summary sheets are built up as grids of cells (which
+  # are small), and are only written at the very end.
+  wb = openpyxl.Workbook(write_only=args.streaming)
+
+  if args.streaming:
+    ws_all = wb.create_sheet("All Charge Integrals")
+  else:
+    ws_all = wb.active
+    ws_all.title = "All Charge Integrals"
+  # The cells of the all integrals sheet, keyed by (row, column).
+  all_cells = {}
+
+  # Write the all integrals headers.
+  for device in devices:
+    header_row = device_pool[device]["start"] - 1
+    # Add a label for this table.
+    all_cells[(header_row - 1, 1)] = "{}:".format(device)
+    # Add a header for the voltages.
+    all_cells[(header_row, ALLINT_VOLTAGE_COL)] = "Voltage"
+    # Add a header for the lifetimes.
+    all_cells[(header_row, ALLINT_LIFETIME_COL)] = "Lifetime"
+    # Note that these iterate over the pool, rather than the index. The effect of this is that
+    # each device will have every row and column, regardless of whether it has data for it.
+    for voltage in pool["row_mappings"]:
+      for lifetime in pool["row_mappings"][voltage]:
+        # - 1 because of not being 0-indexed.
+        all_cells[(device_pool[device]["start"] + pool["row_mappings"][voltage][lifetime] - 1,
+                   ALLINT_VOLTAGE_COL)] = voltage
+        # Ditto.
+        all_cells[(device_pool[device]["start"] + pool["row_mappings"][voltage][lifetime] - 1,
+                   ALLINT_LIFETIME_COL)] = lifetime
+    for density in pool["col_mappings"]:
+      all_cells[(device_pool[device]["start"] - 1,
+                 NUM_NON_DATA_COLUMNS + pool["col_mappings"][density])] \
+          = "Charge ({})".format(density)
+
+  # Populate the workbook with the data.
+  print(Fore.CYAN + "CSVs:")
+  # Reading and integrating the CSV files is farmed out to worker processes, if requested. The
+  # results come back in the same order as the index, which is the order we write in.
+  csv_paths = [path for *_, path in index]
+  cache_dir = None if args.no_cache else open_cache(exp)
+
+  # Everything about this export which determines the contents of the workbook, other than the CSV
+  # files themselves.
+  manifest = {
+      "experiment": os.path.abspath(exp),
+      "options": {"integration": args.integration, "formulas": args.formulas,
+                  "max_points": args.max_points, "decimation": args.decimation,
+                  "shard": args.shard, "shard_cells": args.shard_cells},
+      "layout": {"devices": devices, "pool": pool},
+      "runs": {}}
+  # In incremental mode, the run sheets from the last export are reused for any CSV file that
+  # hasn't changed since. This is only possible if the last export used the same options, and laid
+  # out the tables in the same way, because otherwise every sheet would change.
+  previous_runs = {}
+  # The run sheets of a sharded export are in other workbooks, which formulas in the summary sheets
+  # can't reliably reference, so the summary sheets always hold values.
+  summary_formulas = args.formulas and not args.shard
+  if args.incremental:
+    previous = load_manifest(MANIFEST_PATH)
+    if previous is None or not os.path.exists(WORKBOOK_PATH):
+      print(Fore.YELLOW + "No previous export found. Doing a full export.")
+    elif any(previous.get(key) != manifest[key] for key in ("experiment", "options", "layout")):
+      print(Fore.YELLOW + "Experiment layout or options changed. Doing a full export.")
+    else:
+      with zipfile.ZipFile(WORKBOOK_PATH) as zf:
+        previous_sheets = workbook_sheet_parts(zf)
+      previous_runs = {sheet_name: run for sheet_name, run in previous["runs"].items()
+                       if sheet_name in previous_sheets}
+
+  def run_is_unchanged(sheet_name, path, stat):
+    previous_run = previous_runs.get(sheet_name)
+    # Manifests from before the pulse metrics were measured don't have them to reuse.
+    if not previous_run or "pulse" not in previous_run:
+      return False
+    return previous_run["path"] == os.path.abspath(path) and \
+        previous_run["size"] == stat.st_size and previous_run["mtime"] == stat.st_mtime_ns
+
+  # The results of every run are also written to the results store, so that they can be queried
+  # across experiments.
+  store = None
+  if not args.no_store:
+    store = open_results_store(args.store)
+    experiment_id = store_experiment(store, exp)
+
+  # Whether each run is unchanged is decided once, up front, along with the stat that decided it.
+  # Files can keep changing while the export runs, like the time logs of a sweep that is still
+  # going, and the runs read by the workers have to be exactly those that the loop below expects.
+  run_states = {}
+  for *coords, path in index:
+    sheet_name = run_sheet_name(*coords)
+    stat = os.stat(path)
+    run_states[sheet_name] = (stat, run_is_unchanged(sheet_name, path, stat))
+  changed_paths = [path for *coords, path in index
+                   if not run_states[run_sheet_name(*coords)][1]]
+  reduce_options = {"method": args.integration, "cache_dir": cache_dir,
+                    "max_points": args.max_points, "decimation": args.decimation}
+  if args.shard:
+    # Each shard is reduced and written by a worker process of its own, and only the results needed
+    # for the summary sheets come back. Shards hold runs that are next to each other in the index,
+    # so their results come back in index order.
+    shards = shard_runs(list(index), args.shard, args.shard_cells, args.max_points)
+    shard_files = {run_sheet_name(*run[:4]): shard_path(name)
+                   for name, runs in shards for run in runs}
+    shard_options = dict(reduce_options, formulas=args.formulas,
+                         keep_waveforms=store is not None and args.store_waveforms)
+    reduced_runs = itertools.chain.from_iterable(map_ordered(
+        write_shard,
+        [(shard_path(name), [(run_sheet_name(*run[:4]), run[-1]) for run in runs], shard_options)
+         for name, runs in shards],
+        args.jobs))
+    manifest["shards"] = {}
+    # The rows of the sheet listing which shard each run sheet is in, starting with its header.
+    shard_rows = [["Workbook", "Sheet", "Device", "Voltage (V)", "Lifetime (s)",
+                   "Density (pC/μm)", "File"]]
+  else:
+    reduced_runs = map_ordered(functools.partial(reduce_waveform, **reduce_options),
+                               changed_paths, args.jobs)
+  # The titles of the sheets to copy over from the last export.
+  unchanged_sheets = []
+  # Only this loop is profiled, since it's where the time of an export goes.
+  profiler = None
+  if args.profile:
+    profiler = cProfile.Profile()
+    profiler.enable()
+  # The rows of the pulse metrics sheet, starting with its header.
+  pulse_rows = [["Device", "Voltage (V)", "Lifetime (s)", "Density (pC/μm)"] +
+                [header for _, header in PULSE_METRICS]]
+  last_labels = ()
+  for device, voltage, lifetime, density, path in index:
+    # Print the runs as a tree, only printing the parameters that changed since the last run.
+    labels = (device, voltage_label(voltage), lifetime_label(lifetime))
+    for depth, label in enumerate(labels):
+      if labels[:depth + 1] != last_labels[:depth + 1]:
+        print(Fore.WHITE + "  " * depth + "- {}".format(label))
+    last_labels = labels
+    print(Fore.WHITE + "      - {}: ".format(density_label(density)) + Style.BRIGHT + path)
+
+    # Write the data from the CSV file to a new sheet.
+    position = index.locate(device, voltage, lifetime, density)
+    sheet_name = run_sheet_name(device, voltage, lifetime, density)
+    stat, unchanged = run_states[sheet_name]
+    if unchanged:
+      # Leave an empty sheet in place of the run sheet, to be filled in with the old one when the
+      # workbook is saved.
+      print(Fore.WHITE + "        (unchanged)")
+      wb.create_sheet(sheet_name)
+      unchanged_sheets.append(sheet_name)
+      run = previous_runs[sheet_name]
+    else:
+      # Only a few CSV files are held in memory at a time, so that the rows can be fully assembled
+      # before being appended. A time log whose columns can't be found fails the export, rather than
+      # being skipped like a file that is too short, so that it doesn't go unnoticed.
+      try:
+        run = next(reduced_runs)
+      except ValueError as e:
+        print(Fore.RED + "{} Not exporting.".format(e))
+        os.sys.exit(1)
+      if run is None:
+        print(Fore.RED + "Not enough data in file \"{}\" to integrate. Skipping this file."
+              .format(path))
+        # Drop the run from the index, so that nothing else tries to use it.
+        index.paths[position] = None
+        continue
+      if run["malformed"]:
+        print(Fore.YELLOW + "Skipped {} malformed row(s) in file \"{}\", on line(s) {}.".format(
+            len(run["malformed"]), path, ", ".join(str(line) for line in run["malformed"])))
+      if args.shard:
+        # The run sheet was already written to its shard.
+        shard_file = shard_files[sheet_name]
+        manifest["shards"].setdefault(shard_file, []).append(sheet_name)
+        shard_rows.append([shard_file, sheet_name, device, voltage, lifetime, density, path])
+        num_cells = run["cells"]
+      else:
+        num_cells = write_run_sheet(wb.create_sheet(sheet_name), run, args.integration,
+                                    args.formulas)
+      metrics.add_file(path, run["stats"], num_cells)
+    index.integrals[position] = run["integral"]
+    manifest["runs"][sheet_name] = {
+        "path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime_ns,
+        "integral": run["integral"], "pulse": run["pulse"]}
+    if store is not None:
+      run_id = store_run(store, experiment_id, path, stat, float(run["integral"]), run["pulse"])
+      # The waveforms of unchanged runs are left as the last export stored them.
+      if not unchanged and args.store_waveforms:
+        store_waveform(store, run_id, run["time"], run["current"])
+      elif not unchanged:
+        store_waveform(store, run_id)
+    # NaN can't be written to a sheet, so leave the metrics that couldn't be measured blank.
+    pulse_rows.append([device, voltage, lifetime, density] +
+                      [None if np.isnan(run["pulse"][key]) else run["pulse"][key]
+                       for key, _ in PULSE_METRICS])
+
+    # Write the sum of integrals to the all integrals sheet. When keeping the formulas, reference
+    # the sum on the run sheet instead, so that it can be audited.
+    # - 1 because of not being 0-indexed.
+    all_cells[(device_pool[device]["start"] +
+               pool["row_mappings"][voltage_label(voltage)][lifetime_label(lifetime)] - 1,
+               NUM_NON_DATA_COLUMNS + pool["col_mappings"][density_label(density)])] \
+        = "='{}'!E2".format(sheet_name) if summary_formulas else run["integral"]
+
+  if profiler:
+    profiler.disable()
+    metrics.set_profile(profiler)
+
+  if cache_dir:
+    prune_cache(cache_dir, csv_paths)
+
+  print(Fore.GREEN + "Success.")
+
+  metrics.start_phase("summary")
+  print(Fore.GREEN + "Further processing data...")
+
+  if has_pc:
+    start_pc_row_data = device_pool["PC"]["start"]
+    end_pc_row_data = device_pool["PC"]["end"]
+
+  if "PC_Norm" in device_pool:
+    start_diode_row_data = device_pool["Diode"]["start"]
+
+    start_nc_row_data = device_pool["PC_Norm"]["start"]
+    header_row = start_nc_row_data - 1
+
+    all_cells[(header_row - 1, 1)] = "PC Normalized:"
+
+    trans_normalize = openpyxl.formula.translate.Translator(
+        "=C{}/C${}".format(start_pc_row_data, start_diode_row_data),
+        origin="C{}".format(start_pc_row_data))
+
+  if has_pc:
+    all_cells[(current_free_row, 1)] = "PC Charts:"
+    current_free_row += 1
+
+    # Create Lifetime v. Charge charts.
+    # The - 2 is a very hacky solution to ignore the 100V and 1000V rows. In reality, this doesn't
+    # seem to actually help the chart issues, but hey.
+    x_values = openpyxl.chart.Reference(
+        worksheet=ws_all,
+        min_col=ALLINT_LIFETIME_COL,
+        min_row=start_pc_row_data,
+        max_row=end_pc_row_data - 2)
+    left = True
+    for density, col in pool["col_mappings"].items():
+      column_is_empty = True
+      for row in range(start_pc_row_data, end_pc_row_data + 1):
+        if all_cells.get((row, NUM_NON_DATA_COLUMNS + col)) is not None:
+          column_is_empty = False
+      if column_is_empty is True:
+        continue
+
+      values = openpyxl.chart.Reference(
+          worksheet=ws_all,
+          min_col=NUM_NON_DATA_COLUMNS + col,
+          min_row=start_pc_row_data,
+          max_row=end_pc_row_data - 2)
+
+      chart = openpyxl.chart.LineChart()
+      chart.title = "Charge vs. Lifetime ({})".format(density)
+      # This style has a white main background, a light purple plot background, and a dark purple
+      # line.
+      chart.style = 38
+      chart.width = 13
+      chart.height = 7
+      chart.anchor = "{}{}".format(openpyxl.utils.get_column_letter(1 if left else 6),
+                                   current_free_row)
+      chart.legend = None
+      chart.x_axis.title = "Lifetime"
+      chart.x_axis.scaling.logBase = 10
+      chart.y_axis.title = "Charge"
+      chart.add_data(values)
+      chart.set_categories(x_values)
+      ws_all.add_chart(chart)
+
+      # Advance the "index" at which we are anchoring the chart.
+      left = not left
+      if left:
+        # This is meant to be the height of the chart in cells.
+        current_free_row += 13
+
+      # Go back to working on the NC table, if there is one.
+      if "PC_Norm" not in device_pool:
+        continue
+
+      # This + 1 accounts for the range not including the last element.
+      for row in range(relative_row_data_start, relative_row_data_end + 1):
+        pc_row = (start_pc_row_data - 1) + row
+        pc_col = NUM_NON_DATA_COLUMNS + col
+        pc_value = all_cells.get((pc_row, pc_col))
+        # print(col, row, pc_value)
+        if pc_value is None:
+          continue
+        nc_cell = ((start_nc_row_data - 1) + row, NUM_NON_DATA_COLUMNS + col)
+        if summary_formulas:
+          all_cells[nc_cell] = trans_normalize.translate_formula(
+              "{}{}".format(openpyxl.utils.get_column_letter(pc_col), pc_row))
+        else:
+          # Normalize against the first Diode row, like the formula does.
+          diode_value = all_cells.get((start_diode_row_data, pc_col))
+          if diode_value:
+            all_cells[nc_cell] = pc_value / diode_value
+
+    current_free_row += 13 + NUM_PADDING_CELLS
+
+  if "PC_Norm" in device_pool:
+    all_cells[(current_free_row, 1)] = "PC Normalized Charts:"
+    current_free_row += 1
+
+    # Hardcoding data sources? Nooo, I would never!
+    values = openpyxl.chart.Reference(
+        worksheet=ws_all,
+        min_col=6,
+        min_row=23,
+        max_row=27)
+
+    chart = openpyxl.chart.LineChart()
+    chart.title = "Charge vs. Lifetime ({})".format(density)
+    # This style has a white main background, a light purple plot background, and a dark purple
+    # line.
+    chart.style = 38
+    chart.width = 13
+    chart.height = 7
+    chart.anchor = "A{}".format(current_free_row)
+    chart.legend = None
+    chart.x_axis.title = "Lifetime"
+    chart.x_axis.scaling.logBase = 10
+    chart.y_axis.title = "Charge"
+    chart.add_data(values)
+    chart.set_categories(x_values)
+    ws_all.add_chart(chart)
+
+  # The summary sheets, with their cells. The diode sheet is left out if there are no Diode runs.
+  summary_sheets = [(ws_all, all_cells)]
+
+  # We want to graph charge as a function of density, rather than lifetime/voltage. This is
+  # markedly different than the charts we have made so far. In order to accomplish, here, we copy
+  # the table to the new format, in a new sheet.
+  if has_diode:
+    ws_diode = wb.create_sheet(title="Diode Charge Integral Analysis", index=1)
+    # The cells of the diode integrals sheet, keyed by (row, column).
+    diode_cells = {(1, DIODE_DENSITY_COL): "Density"}
+    # We are only interested in this particular lifetime, so take a slice of the index at it, which
+    # is indexed by [voltage, density]. Only the voltages which have runs at this lifetime are
+    # included.
+    diode_voltages = []
+    if DIODE_LIFETIME in index.axes["lifetime"]:
+      diode_slice = index.select(device="Diode", lifetime=DIODE_LIFETIME)
+      diode_occupied = index.occupied[diode_slice]
+      diode_integrals = index.integrals[diode_slice]
+      voltage_has_lifetime = \
+          index.occupied[index.select(lifetime=DIODE_LIFETIME)].any(axis=(0, 2))
+      diode_voltages = [n for n, has_lifetime in enumerate(voltage_has_lifetime) if has_lifetime]
+    start_col_data = 1
+    # Keep track of the column we're writing to, so we know where to put the chart.
+    current_col = start_col_data
+    # Map what used to be voltage rows, to voltage columns.
+    for voltage_n in diode_voltages:
+      current_col += 1
+      diode_cells[(1, current_col)] = "Charge ({})".format(
+          voltage_label(index.axes["voltage"][voltage_n]))
+    end_col_data = current_col
+
+    start_row_data = 1
+    # Keep track of the row we're writing to, so we know what data to use for the chart.
+    current_row = start_row_data
+    # Note that this iterates in a different order than everywhere else, in doing density, *then*
+    # voltage.
+    for density_n, density in enumerate(index.axes["density"]):
+      current_row += 1
+      # For this, we don't want the "D=".
+      diode_cells[(current_row, DIODE_DENSITY_COL)] = shorten_exp_notation(density)
+      for col, voltage_n in enumerate(diode_voltages, DIODE_DENSITY_COL + 1):
+        if not diode_occupied[voltage_n, density_n]:
+          continue
+        if summary_formulas:
+          diode_cells[(current_row, col)] = "='{}'!E2".format(run_sheet_name(
+              "Diode", index.axes["voltage"][voltage_n], DIODE_LIFETIME, density))
+        else:
+          diode_cells[(current_row, col)] = float(diode_integrals[voltage_n, density_n])
+    end_row_data = current_row
+
+    # Now, we can create the chart.
+
+    x_values = openpyxl.chart.Reference(
+        worksheet=ws_diode,
+        min_col=DIODE_DENSITY_COL,
+        # For setting the category, we don't want to include the header.
+        min_row=start_row_data + 1,
+        max_row=end_row_data)
+
+    values = openpyxl.chart.Reference(
+        worksheet=ws_diode,
+        min_col=DIODE_DENSITY_COL + 1,
+        min_row=start_row_data,
+        max_col=end_col_data,
+        max_row=end_row_data)
+
+    chart = openpyxl.chart.LineChart()
+    chart.title = "Charge vs. Density"
+    chart.style = 38
+    chart.width = 25
+    chart.height = 18
+    # Add 1 to make a gap between the table and chart.
+    chart.anchor = "{}{}".format(openpyxl.utils.get_column_letter(end_col_data + 2),
+                                 start_row_data)
+    chart.x_axis.title = "Density"
+    # It would be nice to fix up the scale so less space is wasted, but this doesn't seem to work
+    # very well/at all.
+    # chart.x_axis.scaling.min = ws_diode.cell(row=2, column=DIODE_DENSITY_COL).value
+    chart.x_axis.scaling.logBase = 10
+    chart.y_axis.scaling.logBase = 10
+    chart.y_axis.title = "Charge"
+    chart.add_data(values, titles_from_data=True)
+    chart.set_categories(x_values)
+    ws_diode.add_chart(chart)
+    summary_sheets.append((ws_diode, diode_cells))
+
+  ws_pulse = wb.create_sheet(title="Pulse Metrics", index=len(summary_sheets))
+
+  # Now that the summary sheets are fully laid out, write them. Write-only worksheets have to be
+  # sized before anything is written to them.
+  for ws, cells in summary_sheets:
+    rows = grid_to_rows(cells)
+    widths = ColumnWidths()
+    widths.fit_grid(cells)
+    widths.apply(ws)
+    for row in rows:
+      ws.append(row)
+    metrics.count(cells_written=len(cells))
+  widths = ColumnWidths()
+  widths.fit_rows(pulse_rows)
+  widths.apply(ws_pulse)
+  for row in pulse_rows:
+    ws_pulse.append(row)
+  metrics.count(cells_written=sum(len(row) for row in pulse_rows))
+
+  print(Fore.GREEN + "Success.")
+
+  if args.resample:
+    metrics.start_phase("resampling")
+    print(Fore.GREEN + "Resampling waveforms...")
+
+    runs = list(index)
+    paths = [path for *_, path in runs]
+    # When watching, the waveforms loaded by the last export are reused, as long as their files
+    # haven't changed since.
+    if loaded_waveforms is None:
+      loaded_waveforms = {}
+    for path in set(loaded_waveforms) - set(paths):
+      del loaded_waveforms[path]
+    versions = {path: (stat.st_size, stat.st_mtime_ns)
+                for path, stat in ((path, os.stat(path)) for path in paths)}
+    stale_paths = [path for path in paths
+                   if path not in loaded_waveforms or loaded_waveforms[path][0] != versions[path]]
+    stale_waveforms = map_ordered(functools.partial(load_waveform, cache_dir=cache_dir),
+                                  stale_paths, args.jobs)
+    for path, waveform in zip(stale_paths, stale_waveforms):
+      loaded_waveforms[path] = (versions[path], waveform)
+    waveforms = [loaded_waveforms[path][1] for path in paths]
+    del loaded_waveforms
+    # The size of the grid is checked before anything is resampled onto it, since the stacked
+    # waveforms would take up a row of the grid for every run.
+    grid = resample_grid(waveforms, args.grid_points)
+    if grid.size >= MAX_SHEET_ROWS:
+      print(Fore.RED + "The time grid has {} points, which is too many to fit in a sheet. Use \
+--grid-points to resample onto fewer points.".format(grid.size))
+    else:
+      stacked = resample_waveforms(waveforms, grid)
+      # Pair up the PC and Diode runs with the same parameters, so that every pair can be compared
+      # at once.
+      row_ns = {tuple(run[:4]): run_n for run_n, run in enumerate(runs)}
+      pairs = [(coords, row_ns[("PC",) + coords], row_ns[("Diode",) + coords])
+               for coords in (tuple(run[1:4]) for run in runs if run[0] == "PC")
+               if ("Diode",) + coords in row_ns]
+      tables = []
+      if pairs:
+        pair_labels = ["{} {} {}".format(voltage_label(voltage), lifetime_label(lifetime),
+                                         density_label(density))
+                       for (voltage, lifetime, density), _, _ in pairs]
+        pc = stacked[[pc_n for _, pc_n, _ in pairs]]
+        diode = stacked[[diode_n for _, _, diode_n in pairs]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+          tables.append(("PC-Diode Ratio", pc / diode, pair_labels))
+        tables.append(("PC-Diode Difference", pc - diode, pair_labels))
+      else:
+        print(Fore.YELLOW + "No PC and Diode runs share parameters. Skipping comparing them.")
+      # Normalize every waveform to its peak, so that their shapes can be compared.
+      peaks = np.abs(stacked).max(axis=1, keepdims=True)
+      with np.errstate(divide="ignore", invalid="ignore"):
+        tables.append(("Normalized Waveforms", stacked / peaks,
+                       [run_sheet_name(*run[:4]) for run in runs]))
+
+      # Put the tables with the other summary sheets, before the run sheets.
+      for table_n, (title, table, labels) in enumerate(tables):
+        ws = wb.create_sheet(title=title, index=wb.sheetnames.index(ws_pulse.title) + 1 + table_n)
+        rows = waveform_table_rows(grid, table, labels)
+        widths = ColumnWidths()
+        widths.fit_row(rows[0])
+        for col in range(1, len(rows[0]) + 1):
+          widths.fit_width(col, NUMBER_CELL_WIDTH)
+        widths.apply(ws)
+        for row in rows:
+          ws.append(row)
+        metrics.count(cells_written=sum(len(row) for row in rows))
+
+    print(Fore.GREEN + "Success.")
+
+  if args.shard:
+    ws_shards = wb.create_sheet("Shards")
+    widths = ColumnWidths()
+    widths.fit_rows(shard_rows)
+    widths.apply(ws_shards)
+    for row in shard_rows:
+      ws_shards.append(row)
+    metrics.count(cells_written=sum(len(row) for row in shard_rows))
+
+  metrics.start_phase("save")
+  print(Fore.GREEN + "Writing Excel file...")
+
+  if unchanged_sheets:
+    # Save to a temporary file, and then splice the unchanged sheets into it from the last export.
+    tmp_path = WORKBOOK_PATH + ".tmp"
+    wb.save(tmp_path)
+    splice_sheets(tmp_path, WORKBOOK_PATH, unchanged_sheets, WORKBOOK_PATH + ".new")
+    os.replace(WORKBOOK_PATH + ".new", WORKBOOK_PATH)
+    os.remove(tmp_path)
+  else:
+    wb.save(WORKBOOK_PATH)
+  # Remove the shards of the last export that this one didn't write.
+  previous_shards = (load_manifest(MANIFEST_PATH) or {}).get("shards", {})
+  for previous_shard in set(previous_shards) - set(manifest.get("shards", {})):
+    if os.path.exists(previous_shard):
+      os.remove(previous_shard)
+  if args.shard:
+    print(Fore.WHITE + "Wrote {} shard(s).".format(len(manifest["shards"])))
+  with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+    json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+  print(Fore.GREEN + "Success.")
+
+  if store is not None:
+    print(Fore.GREEN + "Writing results store...")
+    prune_results_store(store, experiment_id, [path for *_, path in index])
+    store.commit()
+    store.close()
+    print(Fore.GREEN + "Success.")
+
+  if args.format:
+    metrics.start_phase("columnar")
+    print(Fore.GREEN + "Writing columnar tables...")
+
+    # The tables have every point of every run, rather than the decimated waveforms in the run
+    # sheets, so they're read again, from the cache if possible. The runs are in the same order as
+    # the run sheets.
+    def columnar_runs():
+      runs = list(index)
+      waveforms = map_ordered(functools.partial(load_waveform, cache_dir=cache_dir),
+                              [path for *_, path in runs], args.jobs)
+      for (device, voltage, lifetime, density, path), (time, current) in zip(runs, waveforms):
+        run = manifest["runs"][run_sheet_name(device, voltage, lifetime, density)]
+        summary = {"device": device, "voltage": float(voltage), "lifetime": lifetime,
+                   "density": density, "path": path, "rows": time.size,
+                   "integral": float(run["integral"])}
+        summary.update(run["pulse"])
+        metrics.count(rows_parsed=time.size)
+        yield summary, time, current
+
+    for fmt in args.format:
+      data_path = "{}.{}".format(COLUMNAR_DATA_PATH, fmt)
+      summary_path = "{}.{}".format(COLUMNAR_SUMMARY_PATH, fmt)
+      if fmt == "parquet":
+        write_parquet_tables(data_path, summary_path, columnar_runs())
+      else:
+        write_npz_tables(data_path, summary_path, columnar_runs())
+      print(Fore.WHITE + "- " + Style.BRIGHT + data_path + Style.NORMAL + ", " + Style.BRIGHT +
+            summary_path)
+    print(Fore.GREEN + "Success.")
+  metrics.end_phase()
+
+  if args.profile:
+    print(Fore.CYAN + "Phases:")
+    for phase in metrics.phases:
+      print(Fore.WHITE + "- {}: ".format(phase["name"]) + Style.BRIGHT +
+            "{:.3f} s wall, {:.3f} s CPU".format(phase["wall_time"], phase["cpu_time"]))
+    print(Fore.CYAN + "Hottest functions:")
+    for entry in metrics.profile[:PROFILE_NUM_PRINTED]:
+      print(Fore.WHITE + "- {}:{}({}): ".format(entry["file"], entry["line"], entry["function"]) +
+            Style.BRIGHT + "{:.3f} s".format(entry["cumulative_time"]))
+  if args.metrics_json:
+    with open(args.metrics_json, "w", encoding="utf-8") as f:
+      json.dump(metrics.to_dict(), f, indent=2)
+
+  os.sys.exit(0)
+
+
+def is_run_file(filename):
+  """Returns whether a file name is that of a CSV file or Atlas time log, which might hold a run.
+  """
+  return not filename.startswith(".") and \
+      (filename.endswith(".csv") or filename.endswith(LOG_FILENAME_SUFFIX))
+
+
+class InotifyWatcher:
+  """Watches the CSV files and time logs of an experiment for changes, using inotify, which is only
+  available on Linux. It's accessed through libc, with ctypes, rather than a third-party package.
+  Raises OSError if inotify can't be used.
+  """
+
+  def __init__(self, exp_dir):
+    self.libc = ctypes.CDLL(None, use_errno=True)
+    self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if self.fd < 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, os.strerror(errno))
+    # The directories being watched, keyed by watch descriptor.
+    self.dirs = {}
+    self.add_watches(exp_dir)
+
+  def add_watches(self, path):
+    """Watches a directory, and every directory under it, other than hidden ones like the cache.
+    """
+    for root, dirnames, _ in os.walk(path):
+      dirnames[:] = [dirname for dirname in dirnames if not dirname.startswith(".")]
+      wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), INOTIFY_MASK)
+      if wd < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno), root)
+      self.dirs[wd] = root
+
+  def read_events(self):
+    """Reads the pending events. Returns whether any were about runs.
+    """
+    changed = False
+    data = os.read(self.fd, 64 * 1024)
+    offset = 0
+    while offset < len(data):
+      wd, mask, _, name_len = struct.unpack_from(INOTIFY_EVENT_FORMAT, data, offset)
+      offset += struct.calcsize(INOTIFY_EVENT_FORMAT)
+      name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+      offset += name_len
+      if mask & INOTIFY_IGNORED:
+        self.dirs.pop(wd, None)
+      elif mask & INOTIFY_IS_DIR:
+        if name.startswith("."):
+          continue
+        # New directories may already have runs in them, by the time they're watched.
+        if mask & (INOTIFY_CREATE | INOTIFY_MOVED_TO) and wd in self.dirs:
+          self.add_watches(os.path.join(self.dirs[wd], name))
+        changed = True
+      elif is_run_file(name):
+        changed = True
+    return changed
+
+  def wait(self, timeout=None):
+    """Waits for a CSV file or time log to change, for up to timeout seconds, or forever if
+    timeout is None. Returns whether one changed.
+    """
+    deadline = None if timeout is None else perf_counter() + timeout
+    while True:
+      remaining = None if deadline is None else max(deadline - perf_counter(), 0)
+      if not select.select([self.fd], [], [], remaining)[0]:
+        return False
+      if self.read_events():
+        return True
+
+  def close(self):
+    os.close(self.fd)
+
+
+class PollingWatcher:
+  """Watches the CSV files and time logs of an experiment for changes, by periodically comparing
+  their sizes and modification times. This works everywhere, unlike inotify.
+  """
+
+  def __init__(self, exp_dir, interval):
+    self.exp_dir = exp_dir
+    self.interval = interval
+    self.snapshot = self.scan()
+
+  def scan(self):
+    """Returns the size and modification time of every CSV file and time log, keyed by path.
+    """
+    snapshot = {}
+    for root, dirnames, filenames in os.walk(self.exp_dir):
+      dirnames[:] = [dirname for dirname in dirnames if not dirname.startswith(".")]
+      for filename in filter(is_run_file, filenames):
+        path = os.path.join(root, filename)
+        try:
+          stat = os.stat(path)
+        except FileNotFoundError:
+          continue
+        snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+  def wait(self, timeout=None):
+    """Waits for a CSV file or time log to change, for up to timeout seconds, or forever if
+    timeout is None. Returns whether one changed.
+    """
+    deadline = None if timeout is None else perf_counter() + timeout
+    while True:
+      snapshot = self.scan()
+      if snapshot != self.snapshot:
+        self.snapshot = snapshot
+        return True
+      if deadline is None:
+        sleep(self.interval)
+      elif perf_counter() >= deadline:
+        return False
+      else:
+        sleep(min(self.interval, deadline - perf_counter()))
+
+  def close(self):
+    pass
+
+
+def watch(args):
+  exp = find_experiment(args.exp)
+  # Every refresh after the first only has to rebuild the sheets of the runs that changed. Sharded
+  # exports can't reuse sheets, so they're done in full every time, with the shards written in
+  # parallel.
+  args.incremental = not args.shard
+
+  watcher = None
+  if not args.poll and sys.platform.startswith("linux"):
+    try:
+      watcher = InotifyWatcher(exp)
+    except (OSError, AttributeError) as e:
+      print(Fore.YELLOW + "Unable to use inotify ({}). Polling instead.".format(e))
+  if watcher is None:
+    watcher = PollingWatcher(exp, args.poll_interval)
+
+  # The waveforms loaded for resampling are kept in memory between refreshes. Everything else is
+  # either reused from the last workbook, or read from the cache.
+  loaded_waveforms = {}
+
+  def refresh():
+    try:
+      export(args, loaded_waveforms)
+    except SystemExit as e:
+      if e.code:
+        print(Fore.RED + "Export failed. Waiting for more changes.")
+    # Anything else going wrong, like a file being caught halfway through being written, shouldn't
+    # stop the watch either, since the next change may well fix it.
+    except Exception as e:
+      print(Fore.RED + "Export failed ({}: {}). Waiting for more changes.".format(
+          type(e).__name__, e))
+
+  try:
+    refresh()
+    while True:
+      print(Fore.GREEN + "Watching \"{}\" for changes...".format(exp))
+      watcher.wait()
+      # Simulations write their output over a while, and sweeps finish several runs at once, so
+      # wait for the changes to settle down before exporting. Files that never stop changing, like
+      # the log of a long simulation, or a sweep that keeps finishing runs, would put that off
+      # forever, so export anyways once the changes have gone on for long enough.
+      deadline = perf_counter() + args.max_wait
+      while perf_counter() < deadline and \
+              watcher.wait(min(args.debounce, deadline - perf_counter())):
+        pass
+      refresh()
+  except KeyboardInterrupt:
+    print(Fore.GREEN + "Stopped watching.")
+  finally:
+    watcher.close()
+  os.sys.exit(0)
+
+
+def add_pulse_window_arguments(parser):
+  """Adds the options for the pulse window that runs are checked against to a subcommand's parser.
+  """
+  parser.add_argument(
+      "--time-event-start",
+      help="Time at which the single-event upset starts, in s, for checking the pulse window. \
+Defaults to that of Main.in.",
+      type=float,
+      default=TIME_EVENT_START)
+  parser.add_argument(
+      "--pulse-width",
+      help="Width of the pulse window, in s, for checking that it has enough points and that the \
+simulation ran for twice as long. Defaults to the width that Main.in starts with, before it is fit \
+to the pulse.",
+      type=float,
+      default=PULSE_WIDTH)
+
+
+def add_export_arguments(parser):
+  """Adds the options of an export to a subcommand's parser.
+  """
+  parser.add_argument(
+      "--streaming",
+      help="Write the workbook with write-only worksheets, flushing each sheet as it is written, \
+so that memory usage stays flat for large experiments.",
+      action="store_true")
+  parser.add_argument(
+      "--integration",
+      help="Method to use to integrate the current over time.",
+      choices=INTEGRATION_METHODS,
+      default="rectangle")
+  parser.add_argument(
+      "--formulas",
+      help="Write the charge integrals as spreadsheet formulas, rather than as values computed \
+ahead of time, so that they can be audited.",
+      action="store_true")
+  parser.add_argument(
+      "--max-points",
+      help="Decimate the waveforms in the run sheets down to at most this many points. The charge \
+integrals are still computed from every point.",
+      type=int)
+  parser.add_argument(
+      "--decimation",
+      help="Method to use to decimate the waveforms with, if --max-points is given.",
+      choices=DECIMATION_METHODS,
+      default="lttb")
+  parser.add_argument(
+      "--check",
+      help="Check the CSV files for bad data before exporting, like the check subcommand, and \
+don't export if any have problems.",
+      action="store_true")
+  add_pulse_window_arguments(parser)
+  parser.add_argument(
+      "--resample",
+      help="Resample every waveform onto a common time grid, and add sheets with the ratio and \
+difference of the PC and Diode waveforms with the same parameters, and with every waveform \
+normalized to its peak.",
+      action="store_true")
+  parser.add_argument(
+      "--grid-points",
+      help="Resample onto this many evenly spaced points, rather than onto every timestep of \
+every waveform.",
+      type=int)
+  parser.add_argument(
+      "-j",
+      "--jobs",
+      help="Number of processes to read and integrate the CSV files with.",
+      type=int,
+      default=1)
+  parser.add_argument(
+      "--no-cache",
+      help="Don't read from or write to the cache of parsed CSV files in the experiment's \"{}\" \
+directory.".format(CACHE_DIR_NAME),
+      action="store_true")
+  parser.add_argument(
+      "--store",
+      help="Path to the SQLite results store to add the results of the experiment to.",
+      type=str,
+      default=RESULTS_STORE_PATH)
+  parser.add_argument(
+      "--no-store",
+      help="Don't add the results of the experiment to the results store.",
+      action="store_true")
+  parser.add_argument(
+      "--store-waveforms",
+      help="Also store the waveforms of the runs in the results store, as they are written to the \
+run sheets, after any decimation.",
+      action="store_true")
+  parser.add_argument(
+      "--shard",
+      help="Write the run sheets to several workbooks, split up by device and voltage, or by \
+number of cells, alongside an index workbook with the summary sheets, as values, and a sheet \
+listing which workbook each run sheet is in. The workbooks are written by -j processes.",
+      choices=SHARD_METHODS)
+  parser.add_argument(
+      "--shard-cells",
+      help="Number of cells to cap each workbook at, when sharding by number of cells.",
+      type=int,
+      default=DEFAULT_SHARD_CELLS)
+  parser.add_argument(
+      "--format",
+      help="Columnar formats to also write the experiment in, alongside the workbook, as a long \
+table of every point of every run, and a summary table of every run. Parquet requires pyarrow.",
+      nargs="+",
+      choices=COLUMNAR_FORMATS,
+      default=[])
+  parser.add_argument(
+      "--profile",
+      help="Profile writing the run sheets, and print the time taken by each phase of the export, \
+and by the hottest functions.",
+      action="store_true")
+  parser.add_argument(
+      "--metrics-json",
+      help="Write the time, memory usage, and amount of work of each phase of the export, and of \
+each CSV file, to this path as JSON. This includes the profile, if --profile is given.",
+      type=str)
+
+
+def main():
+  """Entrypoint for subcommands.
+  """
+
+  colorama_init(autoreset=True)
+
+  parser = argparse.ArgumentParser()
+  subparsers = parser.add_subparsers()
+
+  subparser_ls = subparsers.add_parser(
+      "ls", help="Lists experiment directories.")
+  subparser_ls.add_argument(
+      "dir",
+      help="Directory to read experiment directories from.",
+      type=str,
+      nargs="?",
+      default=DEFAULT_DATA_DIR)
+  subparser_ls.add_argument(
+      "--refresh",
+      help="Rescan every experiment, rather than only those whose directories have changed since \
+they were last listed.",
+      action="store_true")
+  subparser_ls.add_argument(
+      "--device", help="Only list experiments with runs of these devices.", nargs="+")
+  subparser_ls.add_argument(
+      "--voltage", help="Only list experiments with runs at these voltages.", nargs="+",
+      type=parse_number)
+  subparser_ls.add_argument(
+      "--lifetime", help="Only list experiments with runs at these lifetimes.", nargs="+",
+      type=float)
+  subparser_ls.add_argument(
+      "--density", help="Only list experiments with runs at these densities.", nargs="+",
+      type=float)
+  subparser_ls.set_defaults(func=ls)
+
+  subparser_check = subparsers.add_parser(
+      "check", help="Checks an experiment's CSV files or Atlas time logs for bad data.")
+  subparser_check.add_argument(
+      "exp", help="Directory or name of the experiment to check.", type=str)
+  subparser_check.add_argument(
+      "-j",
+      "--jobs",
+      help="Number of processes to check the CSV files with.",
+      type=int,
+      default=1)
+  add_pulse_window_arguments(subparser_check)
+  subparser_check.set_defaults(func=check)
+
+  subparser_query = subparsers.add_parser(
+      "query", help="Queries the results of exported experiments from the results store.")
+  subparser_query.add_argument(
+      "--store",
+      help="Path to the SQLite results store to query.",
+      type=str,
+      default=RESULTS_STORE_PATH)
+  subparser_query.add_argument(
+      "--columns",
+      help="Columns to show, in order.",
+      nargs="+",
+      choices=RESULTS_QUERY_COLUMNS)
+  subparser_query.add_argument(
+      "--csv", help="Print the results as CSV, rather than as a table.", action="store_true")
+  subparser_query.add_argument(
+      "--experiment", help="Only show runs from experiments with these names.", nargs="+")
+  subparser_query.add_argument(
+      "--device", help="Only show runs of these devices.", nargs="+")
+  subparser_query.add_argument(
+      "--length", help="Only show runs with these lengths of silicon, in microns.", nargs="+",
+      type=parse_number)
+  subparser_query.add_argument(
+      "--dopant-type", help="Only show runs with these types of bulk dopant.", nargs="+")
+  subparser_query.add_argument(
+      "--voltage", help="Only show runs at these voltages.", nargs="+", type=parse_number)
+  subparser_query.add_argument(
+      "--lifetime", help="Only show runs at these lifetimes.", nargs="+", type=float)
+  subparser_query.add_argument(
+      "--density", help="Only show runs at these densities.", nargs="+", type=float)
+  subparser_query.set_defaults(func=query)
+
+  subparser_plot = subparsers.add_parser(
+      "plot", help="Plots an experiment's CSV files or Atlas time logs to image files.")
+  subparser_plot.add_argument(
+      "exp", help="Directory or name of the experiment to plot.", type=str)
+  subparser_plot.add_argument(
+      "-o",
+      "--out",
+      help="Directory to save the figures to.",
+      type=str,
+      default=DEFAULT_PLOT_DIR)
+  subparser_plot.add_argument(
+      "--families",
+      help="Families of figures to plot.",
+      nargs="+",
+      choices=PLOT_FAMILIES,
+      default=list(PLOT_FAMILIES))
+  subparser_plot.add_argument(
+      "--formats",
+      help="Formats to save the figures in.",
+      nargs="+",
+      choices=PLOT_FORMATS,
+      default=["png"])
+  subparser_plot.add_argument(
+      "--dpi", help="Resolution of the figures, in dots per inch.", type=int, default=100)
+  subparser_plot.add_argument(
+      "--integration",
+      help="Method to use to integrate the current over time.",
+      choices=INTEGRATION_METHODS,
+      default="rectangle")
+  subparser_plot.add_argument(
+      "--max-points",
+      help="Decimate the waveforms down to at most this many points for plotting.",
+      type=int,
+      default=DEFAULT_PLOT_MAX_POINTS)
+  subparser_plot.add_argument(
+      "-j",
+      "--jobs",
+      help="Number of processes to read the CSV files, and draw the figures, with.",
+      type=int,
+      default=1)
+  subparser_plot.add_argument(
+      "--no-cache",
+      help="Don't read from or write to the cache of parsed CSV files in the experiment's \"{}\" \
+directory.".format(CACHE_DIR_NAME),
+      action="store_true")
+  subparser_plot.add_argument(
+      "--force",
+      help="Draw every figure, even those whose inputs haven't changed since they were last drawn.",
+      action="store_true")
+  subparser_plot.set_defaults(func=plot)
+
+  subparser_export = subparsers.add_parser(
+      "export", help="Exports an experiment's CSV files or Atlas time logs to Excel.")
+  subparser_export.add_argument(
+      "exp", help="Directory or name of the experiment to export.", type=str)
+  subparser_export.add_argument(
+      "--incremental",
+      help="Only rebuild the sheets of runs which are new or have changed since the last export, \
+reusing the rest from the existing workbook.",
+      action="store_true")
+  add_export_arguments(subparser_export)
+  subparser_export.set_defaults(func=export)
+
+  subparser_watch = subparsers.add_parser(
+      "watch",
+      help="Watches an experiment for new or changed CSV files or Atlas time logs, and exports it \
+incrementally whenever they change, or in full, if sharding.")
+  subparser_watch.add_argument(
+      "exp", help="Directory or name of the experiment to watch.", type=str)
+  subparser_watch.add_argument(
+      "--debounce",
+      help="Number of seconds without any changes to wait for before exporting.",
+      type=float,
+      default=2)
+  subparser_watch.add_argument(
+      "--max-wait",
+      help="Number of seconds to wait for changes to settle down for at most, after which the \
+experiment is exported even if they haven't, so that files that keep changing still show up.",
+      type=float,
+      default=30)
+  subparser_watch.add_argument(
+      "--poll",
+      help="Poll for changes, rather than using inotify.",
+      action="store_true")
+  subparser_watch.add_argument(
+      "--poll-interval",
+      help="Number of seconds between polls for changes, when polling.",
+      type=float,
+      default=1)
+  add_export_arguments(subparser_watch)
+  subparser_watch.set_defaults(func=watch)
+
+  args = parser.parse_args()
+  args.func(args)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+
+# Runs sweeps of Main.in over a grid of parameters. Rather than using the loops in the deck, which
+# run one after another in a single Deckbuild process, a deck is written for every run, and the
+# runs are spread across processes. Every finished run is recorded in a ledger, so that a sweep can
+# be interrupted, and picked up again where it left off.
+#
+# pip install -r requirements.txt
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+
+from colorama import Fore, Style, init as colorama_init
+import numpy as np
+
+import exportlib
+
+# The path of this script, for running the stub simulator.
+SWEEP_PATH = os.path.abspath(__file__)
+# The path of the deck to sweep.
+DEFAULT_DECK_PATH = os.path.join(os.path.dirname(SWEEP_PATH), "..", "decks", "Main.in")
+# The command to run the simulator with. Every argument is formatted with the path of the deck, as
+# {deck}, and the name of the run, as {name}. The simulator runs in the output directory.
+DEFAULT_SIMULATOR = "deckbuild -run {deck}"
+# The command to run the stub simulator with, which writes synthetic time logs instead of running
+# Atlas.
+STUB_SIMULATOR = "{python} {sweep} stub {deck}"
+# The name of the directory, inside of the output directory, to keep the decks, the output of the
+# simulator, and the ledger in. It's hidden, so that exportcsv.py doesn't look inside of it.
+SWEEP_DIR_NAME = ".sweep"
+# The name of the ledger, which has a line of JSON for every run that finished.
+LEDGER_FILENAME = "ledger.jsonl"
+# The variables of Main.in that are set for each run, keyed by the parameters they're set from.
+DECK_VARIABLES = {"device": "device_t", "voltage": "voltage", "lifetime": "lifetime",
+                  "density": "ehp_density"}
+# The number of rows in the time logs written by the stub simulator.
+STUB_ROWS = 200
+
+
+def experiment_name(device, voltage, lifetime, density, si_len=exportlib.DEFAULT_SI_LENGTH,
+                    dopant_t=exportlib.DEFAULT_DOPANT_TYPE, dopant_c=None):
+  """Names a run in the same way as Main.in: the device, followed by every variable that differs
+  from its baseline. Variables are given as strings, and put into the name verbatim, like Deckbuild
+  does, but are compared as numbers.
+  """
+  name = device
+  if float(si_len) != exportlib.DEFAULT_SI_LENGTH:
+    name += "_{}um".format(si_len)
+  if dopant_t != exportlib.DEFAULT_DOPANT_TYPE:
+    name += "_{}".format(dopant_t)
+  if dopant_c is not None and float(dopant_c) != exportlib.DEFAULT_DOPANT_CONCENTRATIONS[device]:
+    name += "_{}".format(dopant_c)
+  if float(voltage) != exportlib.DEFAULT_VOLTAGE:
+    name += "_{}{}".format(exportlib.VOLTAGE_FILENAME_STR, voltage)
+  if float(lifetime) != exportlib.DEFAULT_LIFETIME:
+    name += "_{}{}".format(exportlib.LIFETIME_FILENAME_STR, lifetime)
+  if float(density) != exportlib.DEFAULT_DENSITY:
+    name += "_{}{}".format(exportlib.DENSITY_FILENAME_STR, density)
+  return name
+
+
+def expand_grid(devices, voltages, lifetimes, densities):
+  """Expands a grid of parameters into a run for every combination of them. Returns a list of
+  dictionaries of the parameters of each run, along with its name.
+  """
+  runs = []
+  for device in devices:
+    for voltage in voltages:
+      for lifetime in lifetimes:
+        for density in densities:
+          runs.append({"name": experiment_name(device, voltage, lifetime, density),
+                       "device": device, "voltage": voltage, "lifetime": lifetime,
+                       "density": density})
+  return runs
+
+
+def write_deck(template, run, path, athena=False):
+  """Writes the deck of a run, by setting the variables of a deck to the parameters of the run.
+  Raises ValueError if the deck doesn't set one of them.
+  """
+  deck = template
+  variables = {variable: run[parameter] for parameter, variable in DECK_VARIABLES.items()}
+  # The structure has to be built by each run if it's also being swept, since the prebuilt
+  # structure files are shared between runs.
+  variables["run_athena"] = "true" if athena else "false"
+  for variable, value in variables.items():
+    deck, num_subs = re.subn(r"^set {} = .*$".format(re.escape(variable)),
+                             "set {} = {}".format(variable, value), deck, count=1, flags=re.M)
+    if not num_subs:
+      raise ValueError("Deck doesn't set \"{}\".".format(variable))
+  with open(path, "w", encoding="utf-8") as f:
+    f.write(deck)
+
+
+def read_deck_variables(path):
+  """Reads the variables set by a deck, other than those set conditionally. Returns a dictionary of
+  the values, as strings.
+  """
+  with open(path, encoding="utf-8") as f:
+    return dict(re.findall(r"^set (\w+) = (.*)$", f.read(), flags=re.M))
+
+
+def load_ledger(path):
+  """Loads the ledger of a sweep. Returns a dictionary of the last entry of each run, keyed by its
+  name, which is empty if there is no ledger yet. A line that was cut off by an interruption is
+  ignored.
+  """
+  entries = {}
+  if not os.path.exists(path):
+    return entries
+  with open(path, encoding="utf-8") as f:
+    for line in f:
+      try:
+        entry = json.loads(line)
+      except json.JSONDecodeError:
+        continue
+      entries[entry["name"]] = entry
+  return entries
+
+
+def run_simulator(argv, cwd, output_path):
+  """Runs the simulator on a deck, writing what it prints to a file. Returns its exit code, and how
+  many seconds it took.
+  """
+  start = time.perf_counter()
+  with open(output_path, "w", encoding="utf-8") as f:
+    try:
+      returncode = subprocess.run(argv, cwd=cwd, stdout=f, stderr=subprocess.STDOUT).returncode
+    except OSError as e:
+      f.write("Unable to run the simulator: {}\n".format(e))
+      returncode = None
+  return returncode, time.perf_counter() - start
+
+
+def decks(args):
+  print(Fore.GREEN + "Writing decks...")
+  with open(args.deck, encoding="utf-8") as f:
+    template = f.read()
+  deck_dir = os.path.join(args.out, SWEEP_DIR_NAME, "decks")
+  os.makedirs(deck_dir, exist_ok=True)
+  runs = expand_grid(args.devices, args.voltages, args.lifetimes, args.densities)
+  for run in runs:
+    write_deck(template, run, os.path.join(deck_dir, run["name"] + ".in"), args.athena)
+  print(Fore.WHITE + "Wrote {} decks to \"{}\".".format(len(runs), deck_dir))
+  print(Fore.GREEN + "Success.")
+  os.sys.exit(0)
+
+
+def run(args):
+  with open(args.deck, encoding="utf-8") as f:
+    template = f.read()
+  out = os.path.abspath(args.out)
+  sweep_dir = os.path.join(out, SWEEP_DIR_NAME)
+  for subdir in ("decks", "output"):
+    os.makedirs(os.path.join(sweep_dir, subdir), exist_ok=True)
+  ledger_path = os.path.join(sweep_dir, LEDGER_FILENAME)
+  simulator = shlex.split(STUB_SIMULATOR if args.stub else args.simulator)
+
+  runs = expand_grid(args.devices, args.voltages, args.lifetimes, args.densities)
+  names = [run["name"] for run in runs]
+  if len(set(names)) != len(names):
+    print(Fore.RED + "Some runs of the grid have the same name, like \"{}\". Check for duplicate \
+values.".format(next(name for name in names if names.count(name) > 1)))
+    os.sys.exit(1)
+
+  # Runs that finished, and whose time logs are still around, are skipped.
+  ledger = load_ledger(ledger_path)
+  pending = []
+  for run in runs:
+    entry = ledger.get(run["name"])
+    log_path = os.path.join(out, run["name"] + exportlib.LOG_FILENAME_SUFFIX)
+    if not (entry and entry["status"] == "done" and os.path.exists(log_path)):
+      pending.append(run)
+  print(Fore.CYAN + "Sweep of {} runs, of which {} are done.".format(
+      len(runs), len(runs) - len(pending)))
+
+  print(Fore.GREEN + "Running simulations...")
+  num_failed = 0
+  # The simulations are separate processes, so threads are enough to wait on them.
+  executor = concurrent.futures.ThreadPoolExecutor(args.jobs)
+  try:
+    futures = {}
+    for run in pending:
+      deck_path = os.path.join(sweep_dir, "decks", run["name"] + ".in")
+      write_deck(template, run, deck_path, args.athena)
+      argv = [arg.format(deck=deck_path, name=run["name"], python=sys.executable,
+                         sweep=SWEEP_PATH) for arg in simulator]
+      output_path = os.path.join(sweep_dir, "output", run["name"] + ".out")
+      futures[executor.submit(run_simulator, argv, out, output_path)] = (run, output_path)
+    with open(ledger_path, "a", encoding="utf-8") as ledger_file:
+      for num_finished, future in enumerate(concurrent.futures.as_completed(futures), 1):
+        run, output_path = futures[future]
+        returncode, wall_time = future.result()
+        log_path = os.path.join(out, run["name"] + exportlib.LOG_FILENAME_SUFFIX)
+        done = returncode == 0 and os.path.exists(log_path)
+        entry = dict(run, status="done" if done else "failed", returncode=returncode,
+                     wall_time=wall_time,
+                     finished=datetime.datetime.now().isoformat(timespec="seconds"))
+        ledger_file.write(json.dumps(entry) + "\n")
+        # Flush every entry, so that an interruption loses at most the runs still going.
+        ledger_file.flush()
+        progress = "[{}/{}] ".format(num_finished, len(futures))
+        if done:
+          print(Fore.WHITE + progress + Style.BRIGHT + run["name"] + Style.NORMAL +
+                ": {:.1f} s".format(wall_time))
+        else:
+          num_failed += 1
+          if returncode is None:
+            reason = "the simulator couldn't be run"
+          elif returncode:
+            reason = "exit code {}".format(returncode)
+          else:
+            reason = "no time log was written"
+          print(Fore.RED + progress + run["name"] + ": failed ({}). See \"{}\".".format(
+              reason, output_path))
+  except KeyboardInterrupt:
+    for future in futures:
+      future.cancel()
+    executor.shutdown(wait=False)
+    print(Fore.YELLOW + "Interrupted. Run the sweep again to resume it.")
+    os.sys.exit(1)
+  executor.shutdown()
+
+  if num_failed:
+    print(Fore.RED + "{} run(s) failed. Run the sweep again to retry them.".format(num_failed))
+    os.sys.exit(1)
+  print(Fore.GREEN + "Success.")
+  os.sys.exit(0)
+
+
+def stub(args):
+  # Stands in for Deckbuild: reads the variables of the deck, and writes a synthetic time log named
+  # in the same way as Atlas would, to the current directory.
+
+  # The benchmark is only needed for the stub, so it's imported here, rather than by every
+  # subcommand. It needs the resource module, which isn't available on Windows, where Deckbuild
+  # runs.
+  import benchmark
+
+  variables = read_deck_variables(args.deck)
+  name = experiment_name(variables["device_t"], variables["voltage"], variables["lifetime"],
+                         variables["ehp_density"], variables["si_len"])
+  time.sleep(args.delay)
+  rng = np.random.default_rng(args.seed)
+  waveform = benchmark.synthesize_waveform(rng, float(variables["voltage"]),
+                                           float(variables["lifetime"]),
+                                           float(variables["ehp_density"]), args.rows)
+  benchmark.write_run(name + exportlib.LOG_FILENAME_SUFFIX, *waveform, log=True)
+  print("Simulated \"{}\".".format(name))
+  os.sys.exit(0)
+
+
+def add_grid_arguments(parser):
+  """Adds the arguments describing the grid of parameters to sweep to a subcommand's parser. The
+  defaults are those of the loops in Main.in.
+  """
+  parser.add_argument(
+      "out", help="Directory to run the simulations in, and write the time logs to.", type=str)
+  parser.add_argument(
+      "--deck", help="Deck to sweep.", type=str, default=DEFAULT_DECK_PATH)
+  parser.add_argument(
+      "--devices", help="Devices to sweep.", nargs="+", default=["PC", "Diode"])
+  parser.add_argument(
+      "--voltages", help="Voltages to sweep.", nargs="+", default=["10"])
+  parser.add_argument(
+      "--lifetimes", help="Lifetimes to sweep.", nargs="+", default=["1e-7", "1e-6", "1e-5"])
+  parser.add_argument(
+      "--densities", help="Electron-hole pair densities to sweep.", nargs="+",
+      default=["1e-5", "1e-4", "1e-3", "1e-2", "1e-1", "1e0", "1e1", "1e2", "1e3", "1e4", "1e5"])
+  parser.add_argument(
+      "--athena",
+      help="Have every run build its own structure with Athena, rather than using the prebuilt \
+\"PC.str\" and \"Diode.str\" in the output directory.",
+      action="store_true")
+
+
+def main():
+  """Entrypoint for subcommands.
+  """
+
+  colorama_init(autoreset=True)
+
+  parser = argparse.ArgumentParser()
+  subparsers = parser.add_subparsers()
+
+  subparser_decks = subparsers.add_parser(
+      "decks", help="Writes the deck of every run of a sweep, without running them.")
+  add_grid_arguments(subparser_decks)
+  subparser_decks.set_defaults(func=decks)
+
+  subparser_run = subparsers.add_parser(
+      "run", help="Runs a sweep, skipping the runs that are already done.")
+  add_grid_arguments(subparser_run)
+  subparser_run.add_argument(
+      "-j",
+      "--jobs",
+      help="Number of simulations to run at once.",
+      type=int,
+      default=os.cpu_count())
+  subparser_run.add_argument(
+      "--simulator",
+      help="Command to run the simulator with. \"{deck}\" and \"{name}\" are replaced with the \
+path of the deck and the name of the run, and \"{python}\" and \"{sweep}\" with the paths of the \
+interpreter and this script.",
+      type=str,
+      default=DEFAULT_SIMULATOR)
+  subparser_run.add_argument(
+      "--stub",
+      help="Run the stub simulator, which writes synthetic time logs, rather than Atlas.",
+      action="store_true")
+  subparser_run.set_defaults(func=run)
+
+  subparser_stub = subparsers.add_parser(
+      "stub", help="Simulates a deck by writing a synthetic time log, for testing sweeps.")
+  subparser_stub.add_argument(
+      "deck", help="Deck to simulate.", type=str)
+  subparser_stub.add_argument(
+      "--rows", help="Number of rows to write.", type=int, default=STUB_ROWS)
+  subparser_stub.add_argument(
+      "--delay", help="Number of seconds to take, as if simulating.", type=float, default=0)
+  subparser_stub.add_argument(
+      "--seed", help="Seed for the noise added to the current.", type=int, default=0)
+  subparser_stub.set_defaults(func=stub)
+
+  args = parser.parse_args()
+  args.func(args)
+
+
+if __name__ == "__main__":
+  main()